@@ -1,17 +1,27 @@
-from flask import Flask, render_template, request, make_response, jsonify, send_file
+from flask import Flask, Response, render_template, request, make_response, jsonify, send_file
+from flask.helpers import get_debug_flag
 import io
 import zipfile
 import datetime
 import subprocess
 import os
+import shutil
+import tempfile
+import threading
 import recommendation
 import delay_calculation
+import topology_index
+import instrumentation
 
 import importlib
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
+instrumentation.install_flask_hooks(app)
 saved_config = None
+# PNG rendering runs here, one figure at a time, instead of in the request thread
+PLOT_EXECUTOR = ThreadPoolExecutor(max_workers=1)
 
 # ---------------------------------------------------------------------
 # P. Karimi @ TUE
@@ -180,10 +190,34 @@ def calc_delay():
     saved_config = data
     return jsonify({"message": "Delay config stored OK"})
 
+@app.route('/metrics')
+def metrics():
+    response = make_response(instrumentation.render_prometheus())
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return response
+
 @app.route('/delay_calculation')
 def delay_calculation_page():
     return render_template('delay.html')
 
+@app.route('/delay_stats')
+def delay_stats():
+    global saved_config
+    if not saved_config:
+        return jsonify({"error": "No configuration available. Please set up your topology first."}), 400
+
+    chosen = PERFORMANCE_MODEL_STATE['selected']
+    try:
+        if chosen == "TAS-delay-calculation":
+            return jsonify(delay_calculation.compute_delay_stats(saved_config))
+        plugin_module = importlib.import_module(BUILTIN_PERFORMANCE_MODELS.get(chosen, chosen))
+        if not hasattr(plugin_module, "compute_delay_stats"):
+            return jsonify({"error": f"Performance model '{chosen}' only provides a plot"}), 501
+        return jsonify(plugin_module.compute_delay_stats(saved_config))
+    except Exception as ex:
+        traceback.print_exc()
+        return jsonify({"error": f"Error running performance model '{chosen}': {str(ex)}"}), 500
+
 @app.route('/delay_plot')
 def delay_plot():
     global saved_config
@@ -192,11 +226,12 @@ def delay_plot():
 
     chosen = PERFORMANCE_MODEL_STATE['selected']
     if chosen == "TAS-delay-calculation":
-        buf = delay_calculation.generate_delay_plot(saved_config)
+        report = delay_calculation.compute_delay_stats(saved_config)
+        buf = PLOT_EXECUTOR.submit(delay_calculation.render_delay_plot, report).result()
         return send_file(buf, mimetype='image/png')
     else:
         try:
-            plugin_module = importlib.import_module(chosen)
+            plugin_module = importlib.import_module(BUILTIN_PERFORMANCE_MODELS.get(chosen, chosen))
             buf = plugin_module.generate_delay_plot(saved_config)
             return send_file(buf, mimetype='image/png')
         except Exception as ex:
@@ -204,58 +239,154 @@ def delay_plot():
             return f"Error running custom performance model '{chosen}': {str(ex)}", 500
 
 
+@app.route('/delay_sweep', methods=['POST'])
+def delay_sweep():
+    global saved_config
+    data = request.get_json() or {}
+    config = data.get("config") or saved_config
+    if not config:
+        return jsonify({"error": "No configuration available. Please set up your topology first."}), 400
+    try:
+        result = delay_calculation.run_delay_sweep(config, data.get("variants"), data.get("grid"))
+    except ValueError as ex:
+        return jsonify({"error": str(ex)}), 400
+    except Exception as ex:
+        traceback.print_exc()
+        return jsonify({"error": f"Error running delay sweep: {str(ex)}"}), 500
+    return jsonify(result)
+
+
+@app.route('/port_series')
+def port_series():
+    # binned utilization, gate wait and backlog per egress queue, one row
+    # per (node, port, pcp) queue and one column per time bin
+    global saved_config
+    if not saved_config:
+        return jsonify({"error": "No configuration available. Please set up your topology first."}), 400
+    bins = request.args.get("bins", 100, type=int)
+    if not 1 <= bins <= 10000:
+        return jsonify({"error": "bins must be an integer between 1 and 10000"}), 400
+    try:
+        return jsonify(delay_calculation.compute_port_series(saved_config, bins))
+    except Exception as ex:
+        traceback.print_exc()
+        return jsonify({"error": f"Error computing port series: {str(ex)}"}), 500
+
+
+@app.route('/delay_trace')
+def delay_trace():
+    # per-packet, per-hop trace of the built-in delay model as a download;
+    # ?format=npz (default) or ?format=parquet
+    global saved_config
+    if not saved_config:
+        return jsonify({"error": "No configuration available. Please set up your topology first."}), 400
+    fmt = request.args.get("format", "npz")
+    if fmt not in ("npz", "parquet"):
+        return jsonify({"error": f"Unknown trace format '{fmt}'"}), 400
+
+    tmp_dir = tempfile.mkdtemp(prefix="insim_trace_")
+    path = os.path.join(tmp_dir, f"delay_trace.{fmt}")
+    try:
+        delay_calculation.export_delay_trace(saved_config, path)
+    except ValueError as ex:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return jsonify({"error": str(ex)}), 400
+    except Exception as ex:
+        traceback.print_exc()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return jsonify({"error": f"Error writing delay trace: {str(ex)}"}), 500
+
+    def stream():
+        try:
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(1 << 20)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    headers = {"Content-Disposition": f"attachment; filename=delay_trace.{fmt}",
+               "Content-Length": str(os.path.getsize(path))}
+    return Response(stream(), mimetype="application/octet-stream", headers=headers)
+
+
 @app.route("/run_tas_scheduler", methods=["POST"])
 def run_tas_scheduler():
-    from drl_tas_runner import run_drl_scheduler
+    import drl_tas_runner
 
     data = request.get_json()
     if not data:
         return jsonify({"error": "No data received"}), 400
 
     flows = data.get("flows", [])
-    temp_csv = "temp_drl_scenario.csv"
-    export_flows_to_csv(flows, temp_csv)
-
 
     chosen_sched = SCHEDULER_STATE['selected']
     if chosen_sched == "TAS-scheduler":
         try:
-            gcl_output = run_drl_scheduler(temp_csv)
+            gcl_output = run_scheduler_plugin(drl_tas_runner, flows)
             return jsonify({"gcl": gcl_output})
         except Exception as ex:
             return jsonify({"error": str(ex)}), 500
     else:
         try:
             plugin_module = importlib.import_module(chosen_sched)
-            gcl_output = plugin_module.run_drl_scheduler(temp_csv)
+            gcl_output = run_scheduler_plugin(plugin_module, flows)
             return jsonify({"gcl": gcl_output})
         except Exception as ex:
             traceback.print_exc()
             return jsonify({"error": f"Error in custom scheduler '{chosen_sched}': {ex}"}), 500
 
+def run_scheduler_plugin(module, flows):
+    # schedulers that define schedule_flows(flows) get the flows in memory;
+    # older plugins only take run_drl_scheduler(csv_path), so they get a CSV
+    # in a private temp file
+    if hasattr(module, "schedule_flows"):
+        return module.schedule_flows(scheduler_flows(flows))
+    fd, csv_path = tempfile.mkstemp(prefix="insim_flows_", suffix=".csv")
+    os.close(fd)
+    try:
+        export_flows_to_csv(flows, csv_path)
+        return module.run_drl_scheduler(csv_path)
+    finally:
+        os.remove(csv_path)
+
+def scheduler_flows(flows):
+    # UI flows as scheduler flows, keyed like the scenario CSV columns
+    rows = []
+    for i, flow in enumerate(flows):
+        sid = flow.get("sourceId", f"unknownSrc_{i}")
+        did = flow.get("destId", f"unknownDst_{i}")
+        pkt_size_str = flow.get("packetSize", "1000B")
+        try:
+            pkt_size_val = int(pkt_size_str.lower().replace("b",""))
+        except:
+            pkt_size_val = 1000
+        rows.append({"id": i, "talker": sid, "listener": did, "frame_size": pkt_size_val,
+                     "period": 1.0, "deadline": 2.0, "release_time": 0.0,
+                     "queue": flow.get("trafficClass", 0)})
+    return rows
+
+SCHEDULER_CSV_COLUMNS = ["id", "talker", "listener", "frame_size", "period", "deadline", "release_time", "queue"]
+
 def export_flows_to_csv(flows, csv_path):
     import csv
     with open(csv_path, "w", newline="") as f:
         writer = csv.writer(f)
-        writer.writerow(["id", "talker", "listener", "frame_size", "period", "deadline", "release_time", "queue"])
-        for i, flow in enumerate(flows):
-            sid = flow.get("sourceId", f"unknownSrc_{i}")
-            did = flow.get("destId", f"unknownDst_{i}")
-            pkt_size_str = flow.get("packetSize", "1000B")
-            try:
-                pkt_size_val = int(pkt_size_str.lower().replace("b",""))
-            except:
-                pkt_size_val = 1000
-            period_val = 1.0
-            deadline_val = 2.0
-            release_val = 0.0
-            queue_val = flow.get("trafficClass", 0)
-            writer.writerow([i, sid, did, pkt_size_val, period_val, deadline_val, release_val, queue_val])
+        writer.writerow(SCHEDULER_CSV_COLUMNS)
+        for row in scheduler_flows(flows):
+            writer.writerow([row[k] for k in SCHEDULER_CSV_COLUMNS])
 
 
 PERFORMANCE_MODEL_STATE = {
     "selected": "TAS-delay-calculation",  
-    "plugins": ["TAS-delay-calculation"]  
+    "plugins": ["TAS-delay-calculation", "TAS-delay-bound"]  
+}
+# built-in models whose registry name is not their module name
+BUILTIN_PERFORMANCE_MODELS = {
+    "TAS-delay-calculation": "delay_calculation",
+    "TAS-delay-bound": "delay_bound",
 }
 SCHEDULER_STATE = {
     "selected": "TAS-scheduler",  
@@ -359,17 +490,10 @@ def list_scheduler_plugins():
 def generate_ned_file(nodes, links, global_config):
     network_name = global_config.get('networkName', 'TsnLinearNetwork')
     default_link_speed = global_config.get('defaultLinkSpeed', '100Mbps')
+    topo = topology_index.get_topology_index(links, default_link_speed)
     port_counts = {}
     for node in nodes:
-        port_counts[node["id"]] = 0
-
-    for link in links:
-        s_node = link["sourceNode"]
-        t_node = link["targetNode"]
-        s_port = link.get("sourcePort", 0)
-        t_port = link.get("targetPort", 0)
-        port_counts[s_node] = max(port_counts[s_node], s_port + 1)
-        port_counts[t_node] = max(port_counts[t_node], t_port + 1)
+        port_counts[node["id"]] = topo.port_counts.get(node["id"], 0)
 
     header = f"""// Generated TSN Network
 package inet.networks.tsn;
@@ -529,5 +653,21 @@ def generate_ini_file(nodes, links, flows, global_config):
 
     return "\n".join(lines)
 
+def warm_up_scheduler():
+    try:
+        from drl_tas_runner import warm_up_model
+        warm_up_model()
+    except Exception as ex:
+        print(f"Scheduler warm-up failed: {ex}")
+
+# Set INSIM_WARMUP=1 to import stable_baselines3 and load the PPO model in
+# the background at start-up instead of on the first scheduling request.
+# Not when multiprocessing re-imports this module as __mp_main__, and not in
+# the watching parent of the debug reloader (python app.py, flask run
+# --debug): only the child it starts with WERKZEUG_RUN_MAIN=true serves
+reloader_parent = os.environ.get("WERKZEUG_RUN_MAIN") != "true" and (__name__ == "__main__" or get_debug_flag())
+if os.environ.get("INSIM_WARMUP") == "1" and __name__ != "__mp_main__" and not reloader_parent:
+    threading.Thread(target=warm_up_scheduler, name="insim-warmup", daemon=True).start()
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,266 @@
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# ---------------------------------------------------------------------
+# P. Karimi @ TUE
+# ---------------------------------------------------------------------
+
+# Scale benchmarks. Every run executes in a fresh process, so timings are
+# cold (no delay cache, no loaded model) and the peak RSS belongs to that
+# run alone. Results are printed as JSON.
+#
+#   python benchmark.py                      # small + medium suites
+#   python benchmark.py --suite large --only delay,ned,ini
+#   python benchmark.py --zones 12 --flows 400 --sim-time 1s --repeat 5
+
+SUITES = {
+    "small":  dict(zones=4, devices=4, flows=20, traffic_classes=2, gcl_entries=2, sim_time="20ms"),
+    "medium": dict(zones=6, devices=4, flows=100, traffic_classes=3, gcl_entries=3, sim_time="100ms"),
+    "large":  dict(zones=12, devices=8, flows=400, traffic_classes=4, gcl_entries=4, sim_time="1s"),
+}
+BENCHMARKS = ("delay", "env", "scheduler", "ned", "ini")
+
+PACKET_SIZES = (64, 128, 256, 512, 1000, 1500)
+INTERVALS_US = (100, 200, 250, 500, 1000, 2000, 5000)
+
+
+def generate_scenario(zones=6, devices=4, flows=50, traffic_classes=2, gcl_entries=2,
+                      sim_time="20ms", seed=0, link_speed="100Mbps", cycle_us=1000):
+    # zonal layout with the names of drl_tas_runner.define_zonal_topology:
+    # each zone switch hangs off Central_Switch and has one controller plus
+    # (devices - 1) sensors; Central_Computer sits on Central_Switch port 0
+    rnd = random.Random(seed)
+    nodes = [{"id": "Central_Switch", "type": "TsnSwitch", "gclConfigs": []},
+             {"id": "Central_Computer", "type": "TsnDevice"}]
+    links = [{"sourceNode": "Central_Switch", "sourcePort": 0,
+              "targetNode": "Central_Computer", "targetPort": 0}]
+    endpoints = ["Central_Computer"]
+    for z in range(zones):
+        zsw = f"Zone_{z}_Switch"
+        nodes.append({"id": zsw, "type": "TsnSwitch", "gclConfigs": []})
+        links.append({"sourceNode": "Central_Switch", "sourcePort": z + 1,
+                      "targetNode": zsw, "targetPort": 0})
+        for d in range(devices):
+            dev = f"Zone_{z}_Controller" if d == 0 else f"Zone_{z}_Sensor{d-1}"
+            nodes.append({"id": dev, "type": "TsnDevice"})
+            links.append({"sourceNode": zsw, "sourcePort": d + 1,
+                          "targetNode": dev, "targetPort": 0})
+            endpoints.append(dev)
+
+    if gcl_entries:
+        # one schedule per queue (the parser keeps one per queue), opening
+        # gcl_entries times per cycle; the last closed slot takes the
+        # remainder so every cycle is exactly cycle_us
+        slot = cycle_us // (2 * gcl_entries)
+        slots = [slot] * (2 * gcl_entries)
+        slots[-1] += cycle_us - sum(slots)
+        durations = "[" + ",".join(f"{d}us" for d in slots) + "]"
+        for node in nodes:
+            if node["type"] != "TsnSwitch":
+                continue
+            num_ports = zones + 1 if node["id"] == "Central_Switch" else devices + 1
+            for p in range(num_ports):
+                node["gclConfigs"].append({"portIndex": p, "schedule": [
+                    {"offset": f"{q * slot // traffic_classes}us",
+                     "durations": durations,
+                     "queueIndex": q}
+                    for q in range(traffic_classes)]})
+
+    flow_list = []
+    for i in range(flows):
+        src = rnd.choice(endpoints[1:])
+        dst = "Central_Computer" if rnd.random() < 0.5 else rnd.choice([e for e in endpoints if e != src])
+        flow_list.append({
+            "name": f"s{i}",
+            "sourceId": src,
+            "destId": dst,
+            "packetSize": f"{rnd.choice(PACKET_SIZES)}B",
+            "interval": f"{rnd.choice(INTERVALS_US)}us",
+            "trafficClass": rnd.randrange(traffic_classes),
+        })
+
+    return {
+        "nodes": nodes,
+        "links": links,
+        "flows": flow_list,
+        "globalConfig": {"networkName": "TsnBenchmarkNetwork", "defaultSimTime": sim_time,
+                         "defaultLinkSpeed": link_speed},
+    }
+
+
+def write_drl_csv(config, csv_path, zones):
+    # TASEnv routes on define_zonal_topology(zones), which has a controller
+    # and three sensors per zone; flows between other devices are skipped
+    from drl_tas_runner import define_zonal_topology
+    G = define_zonal_topology(num_zones=zones)
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "talker", "listener", "frame_size", "period", "deadline", "release_time", "queue"])
+        for i, flow in enumerate(config["flows"]):
+            if flow["sourceId"] not in G or flow["destId"] not in G:
+                continue
+            size = int(flow["packetSize"].rstrip("B"))
+            writer.writerow([i, flow["sourceId"], flow["destId"], size, 1.0, 2.0, 0.0,
+                             flow["trafficClass"]])
+    return G
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _bench_delay(config, params):
+    import delay_calculation
+    scn = delay_calculation.compile_scenario(config)
+    packets = int((scn.sim_end // scn.flow_interval + 1).sum())
+    start = time.perf_counter()
+    delay_calculation.generate_delay_plot(config)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "packets": packets, "packets_per_s": packets / seconds,
+            "packet_hops_per_s": float(scn.packet_hops().sum()) / seconds}
+
+
+def _bench_env(config, params):
+    import numpy as np
+    from drl_tas_runner import TASEnv
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "flows.csv")
+        G = write_drl_csv(config, csv_path, params["zones"])
+        env = TASEnv([csv_path], G, max_flows=50, alpha=0.01, num_queues=8, max_segments=10)
+        rng = np.random.default_rng(params["seed"])
+        random.seed(params["seed"])
+        resets = steps = 0
+        reset_time = step_time = 0.0
+        while steps < params["env_steps"]:
+            t = time.perf_counter()
+            env.reset()
+            reset_time += time.perf_counter() - t
+            resets += 1
+            done = False
+            while not done:
+                action = rng.random(9).astype(np.float32)
+                t = time.perf_counter()
+                _, _, done, _ = env.step(action)
+                step_time += time.perf_counter() - t
+                steps += 1
+    return {"seconds": reset_time + step_time, "resets": resets, "steps": steps,
+            "resets_per_s": resets / reset_time, "steps_per_s": steps / step_time}
+
+
+def _bench_scheduler(config, params):
+    from drl_tas_runner import run_drl_scheduler
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "flows.csv")
+        write_drl_csv(config, csv_path, 6)  # run_drl_scheduler always uses six zones
+        start = time.perf_counter()
+        gcl = run_drl_scheduler(csv_path)
+        seconds = time.perf_counter() - start
+    return {"seconds": seconds, "gcl_entries": sum(len(p["schedule"]) for p in gcl)}
+
+
+def _bench_ned(config, params):
+    from app import generate_ned_file
+    start = time.perf_counter()
+    text = generate_ned_file(config["nodes"], config["links"], config["globalConfig"])
+    return {"seconds": time.perf_counter() - start, "bytes": len(text)}
+
+
+def _bench_ini(config, params):
+    from app import generate_ini_file
+    start = time.perf_counter()
+    text = generate_ini_file(config["nodes"], config["links"], config["flows"], config["globalConfig"])
+    return {"seconds": time.perf_counter() - start, "bytes": len(text)}
+
+
+_RUNNERS = {"delay": _bench_delay, "env": _bench_env, "scheduler": _bench_scheduler,
+            "ned": _bench_ned, "ini": _bench_ini}
+
+
+def _run_one(name, params):
+    # run_drl_scheduler loads its model relative to the project directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    config = generate_scenario(**{k: params[k] for k in
+                                  ("zones", "devices", "flows", "traffic_classes",
+                                   "gcl_entries", "sim_time", "seed")})
+    baseline = _peak_rss_mb()
+    result = _RUNNERS[name](config, params)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    result["baseline_rss_mb"] = baseline
+    return result
+
+
+def run_benchmarks(params, only=BENCHMARKS, repeat=1):
+    results = {}
+    ctx = get_context("spawn")
+    for name in only:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                runs.append(pool.submit(_run_one, name, params).result())
+        summary = {k: statistics.median(r[k] for r in runs)
+                   for k in runs[0] if all(isinstance(r[k], (int, float)) for r in runs)}
+        summary["best_seconds"] = min(r["seconds"] for r in runs)
+        summary["runs"] = len(runs)
+        results[name] = summary
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TSN-INSIM scale benchmarks")
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES),
+                        help="predefined scenario size (repeatable; default small and medium)")
+    parser.add_argument("--zones", type=int)
+    parser.add_argument("--devices", type=int)
+    parser.add_argument("--flows", type=int)
+    parser.add_argument("--traffic-classes", type=int)
+    parser.add_argument("--gcl-entries", type=int)
+    parser.add_argument("--sim-time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--env-steps", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--only", default=",".join(BENCHMARKS),
+                        help="comma-separated subset of: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    only = [b.strip() for b in args.only.split(",") if b.strip()]
+    unknown = set(only) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    overrides = {k: getattr(args, k) for k in
+                 ("zones", "devices", "flows", "traffic_classes", "gcl_entries", "sim_time")
+                 if getattr(args, k) is not None}
+    suites = args.suite or (["custom"] if overrides else ["small", "medium"])
+
+    report = {"python": sys.version.split()[0], "cpus": os.cpu_count(), "suites": {}}
+    for suite in suites:
+        params = dict(SUITES.get(suite, SUITES["medium"]))
+        params.update(overrides)
+        params.update(seed=args.seed, env_steps=args.env_steps)
+        report["suites"][suite] = {"params": params,
+                                   "results": run_benchmarks(params, only, args.repeat)}
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
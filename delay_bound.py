@@ -0,0 +1,136 @@
+import io
+import math
+import numpy as np
+from delay_calculation import compile_scenario
+
+# ---------------------------------------------------------------------
+# P. Karimi @ TUE
+# ---------------------------------------------------------------------
+
+# Worst-case end-to-end delay bounds in closed form (network calculus).
+# Every (node, port, pcp) queue is a FIFO rate-latency server over the
+# gate's open windows; every flow is a token bucket of one packet per
+# interval whose burst grows by interval-scaled hop delay along its path.
+# Work is measured in nanoseconds of link time, the same as hop_tx in the
+# simulator, so the bounds hold for delay_calculation's own results.
+
+MAX_PASSES = 100
+
+
+def gate_service(gsch):
+    # (share of the cycle the gate is open, worst-case service latency)
+    if gsch is None:
+        return 1.0, 0.0
+    T = gsch.cycle_time
+    starts, ends = gsch.starts.tolist(), gsch.ends.tolist()
+    open_time = sum(e - s for s, e in zip(starts, ends))
+    if open_time <= 0:
+        return 0.0, math.inf
+    if open_time >= T:
+        return 1.0, 0.0
+    share = open_time / T
+
+    # a backlog that arrives just as a window closes waits longest; from
+    # there, the deficit to the average rate peaks at each next opening
+    latency = 0.0
+    n = len(starts)
+    for i in range(n):
+        served = 0.0
+        for k in range(1, n + 1):
+            j = (i + k) % n
+            shift = T if i + k >= n else 0
+            latency = max(latency, starts[j] + shift - ends[i] - served / share)
+            served += ends[j] - starts[j]
+    return share, latency
+
+
+def _queue_delays(scn, hop_burst, service, hops_by_queue):
+    period = scn.flow_interval.astype(np.float64)
+    hop_flow = np.repeat(np.arange(scn.num_flows), np.diff(scn.hop_ptr))
+    queue_delay = np.zeros(len(scn.queue_keys))
+    order = scn.queue_order if scn.queue_order is not None else range(len(scn.queue_keys))
+    for q in order:
+        hops = hops_by_queue[q]
+        share, latency = service[q]
+        tx = scn.hop_tx[hops]
+        load = float((tx / period[hop_flow[hops]]).sum())
+        if load > share:
+            d = math.inf
+        else:
+            d = latency + float((hop_burst[hops] * tx).sum()) / share
+        queue_delay[q] = d
+        nxt = hops + 1
+        cont = nxt < scn.hop_ptr[hop_flow[hops] + 1]
+        hop_burst[nxt[cont]] = hop_burst[hops[cont]] + d / period[hop_flow[hops[cont]]]
+    return queue_delay
+
+
+def compute_flow_bounds(scn):
+    service = [gate_service(g) for g in scn.queue_gates]
+    order = np.argsort(scn.hop_queue, kind="stable")
+    cuts = np.searchsorted(scn.hop_queue[order], np.arange(len(scn.queue_keys) + 1))
+    hops_by_queue = [order[cuts[q]:cuts[q+1]] for q in range(len(scn.queue_keys))]
+
+    # bursts in packets; every flow enters the network with one packet
+    hop_burst = np.ones(len(scn.hop_queue))
+    if scn.queue_order is not None:
+        queue_delay = _queue_delays(scn, hop_burst, service, hops_by_queue)
+    else:
+        # cyclic dependencies: iterate to the fixed point, or give up
+        for _ in range(MAX_PASSES):
+            before = hop_burst.copy()
+            queue_delay = _queue_delays(scn, hop_burst, service, hops_by_queue)
+            if np.allclose(hop_burst, before, rtol=1e-9, atol=0):
+                break
+        else:
+            queue_delay[:] = math.inf
+
+    hop_delay = queue_delay[scn.hop_queue]
+    return np.add.reduceat(hop_delay, scn.hop_ptr[:-1]) if scn.num_flows else hop_delay[:0]
+
+
+def compute_delay_bounds(config):
+    scn = compile_scenario(config)
+    bounds = compute_flow_bounds(scn)
+    streams = {}
+    for name, bound, hops in zip(scn.flow_names, bounds.tolist(), np.diff(scn.hop_ptr).tolist()):
+        s = streams.setdefault(name, {"name": name, "bound": 0.0, "hops": hops})
+        s["bound"] = max(s["bound"], bound)
+        s["hops"] = max(s["hops"], hops)
+    for s in streams.values():
+        s["bound"] = s["bound"] / 1e6 if math.isfinite(s["bound"]) else None  # in ms
+    return {"unit": "ms", "kind": "bound", "streams": [streams[k] for k in sorted(streams)]}
+
+
+def compute_delay_stats(config):
+    return compute_delay_bounds(config)
+
+
+def generate_delay_plot(config):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    report = compute_delay_bounds(config)
+    streams = report["streams"]
+    fig = Figure(figsize=(8, max(4, 0.25 * len(streams) + 1)))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    finite = [s["bound"] for s in streams if s["bound"] is not None]
+    cap = max(finite) * 1.1 if finite else 1.0
+    y = np.arange(len(streams))
+    ax.barh(y, [s["bound"] if s["bound"] is not None else cap for s in streams],
+            color=["C0" if s["bound"] is not None else "C3" for s in streams])
+    for i, s in enumerate(streams):
+        if s["bound"] is None:
+            ax.text(cap, i, " unbounded", va="center", color="C3")
+    ax.set_yticks(y)
+    ax.set_yticklabels([f"Stream {s['name']}" for s in streams])
+    ax.invert_yaxis()
+    ax.set_xlabel(f"Worst-Case End-to-End Delay Bound ({report['unit']})")
+    ax.grid(True, axis="x")
+    fig.tight_layout()
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    buf.seek(0)
+    return buf
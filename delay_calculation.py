@@ -1,22 +1,27 @@
-import io
+import os
 import math
-import matplotlib.pyplot as plt
+import heapq
+import hashlib
+import itertools
+import copy
+import threading
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_all_start_methods, get_context
+import numpy as np
+from topology_index import parse_bitrate, get_topology_index
+from delay_stats import DelayStats, stats_report, render_delay_plot
+from delay_trace import TraceWriter, TRACE_CHUNK_ROWS
+from port_stats import PortSeries
+from instrumentation import span
 
 # ---------------------------------------------------------------------
 # P. Karimi @ TUE
 # ---------------------------------------------------------------------
 
-def parse_bitrate(speed_str):
-    s = speed_str.strip().lower()
-    if s.endswith("mbps"):
-        val = float(s.replace("mbps", ""))
-        return val * 1e6
-    elif s.endswith("gbps"):
-        val = float(s.replace("gbps", ""))
-        return val * 1e9
-    else:
-        return 100e6  
-
 def parse_packet_size(size_str):
     s = size_str.strip().lower()
     if s.endswith("b"):
@@ -43,14 +48,17 @@ def parse_time_to_seconds(time_str):
         except:
             return 2e-4  
 
-def parse_durations(dur_str):
+def parse_time_to_ns(time_str):
+    return int(round(parse_time_to_seconds(time_str) * 1e9))
+
+def parse_durations(dur_str, parse_time=parse_time_to_seconds):
     ds = dur_str.strip().strip("[]")
     if not ds:
         return []
     parts = ds.split(",")
     results = []
     for p in parts:
-        results.append(parse_time_to_seconds(p))
+        results.append(parse_time(p))
     return results
 
 
@@ -100,24 +108,52 @@ class GateSchedule:
                         merged.append(intr)
             self.open_intervals = merged
 
+        ordered = sorted(self.open_intervals)
+        self.starts = np.array([start for (start, end) in ordered])
+        self.ends = np.array([end for (start, end) in ordered])
+        self._start_list = self.starts.tolist()
+        self._end_list = self.ends.tolist()
+
     def is_open(self, t):
         modt = t % self.cycle_time
-        for (start, end) in self.open_intervals:
-            if start <= modt < end:
-                return True
-        return False
+        i = bisect_right(self._end_list, modt)
+        return i < len(self._start_list) and self._start_list[i] <= modt
 
     def next_open_time(self, t):
         modt = t % self.cycle_time
-        for (start, end) in sorted(self.open_intervals):
-            if modt < start:
-                return t - modt + start
-            if start <= modt < end:
-                return t
-        first_start = sorted(self.open_intervals)[0][0]
-        return t - modt + self.cycle_time + first_start
-
-def parse_node_gateschedules(nodes):
+        i = bisect_right(self._end_list, modt)
+        if i == len(self._start_list):
+            return t - modt + self.cycle_time + self._start_list[0]
+        start = self._start_list[i]
+        return t if start <= modt else t - modt + start
+
+    def open_window(self, t):
+        modt = t % self.cycle_time
+        base = t - modt
+        i = bisect_right(self._end_list, modt)
+        if i == len(self._start_list):
+            base += self.cycle_time
+            i = 0
+        elif self._start_list[i] <= modt:
+            return t, base + self._end_list[i]
+        return base + self._start_list[i], base + self._end_list[i]
+
+    def is_open_many(self, ts):
+        modt = np.mod(ts, self.cycle_time)
+        i = np.searchsorted(self.ends, modt, side="right")
+        inside = i < len(self.starts)
+        return inside & (self.starts[np.minimum(i, len(self.starts) - 1)] <= modt)
+
+    def next_open_times(self, ts):
+        modt = np.mod(ts, self.cycle_time)
+        base = ts - modt
+        i = np.searchsorted(self.ends, modt, side="right")
+        wrap = i == len(self.starts)
+        start = np.where(wrap, self.cycle_time + self.starts[0],
+                         self.starts[np.where(wrap, 0, i)])
+        return np.where(start <= modt, ts, base + start)
+
+def parse_node_gateschedules(nodes, parse_time=parse_time_to_seconds):
     from collections import defaultdict
     gate_schedules = defaultdict(lambda: defaultdict(dict))
     for node in nodes:
@@ -132,172 +168,980 @@ def parse_node_gateschedules(nodes):
                 offset_str    = sched.get("offset", "0ms")
                 durations_str = sched.get("durations", "[4ms,6ms]")
                 queue_index   = sched.get("queueIndex", 0)
-                offset_val    = parse_time_to_seconds(offset_str)
-                durations     = parse_durations(durations_str)
+                offset_val    = parse_time(offset_str)
+                durations     = parse_durations(durations_str, parse_time)
                 gate_schedules[n_id][port_idx][queue_index] = GateSchedule(offset_val, durations, first_state_open=True)
     return gate_schedules
 
 
 def build_hop_path(src_node, dst_node, links):
-    from collections import defaultdict, deque
-    graph = defaultdict(list)
-    link_map = {}
-    for lk in links:
-        nA = lk["sourceNode"]
-        nB = lk["targetNode"]
-        graph[nA].append(nB)
-        graph[nB].append(nA)
-        link_map[(nA, nB)] = lk
-        link_map[(nB, nA)] = lk
-    visited = set()
-    parent = {}
-    queue = deque([src_node])
-    visited.add(src_node)
-    found = False
-    while queue:
-        cur = queue.popleft()
-        if cur == dst_node:
-            found = True
-            break
-        for nbr in graph[cur]:
-            if nbr not in visited:
-                visited.add(nbr)
-                parent[nbr] = cur
-                queue.append(nbr)
-    if not found:
-        return []
-    path_nodes = []
-    x = dst_node
-    while x != src_node:
-        path_nodes.append(x)
-        x = parent[x]
-    path_nodes.append(src_node)
-    path_nodes.reverse()
-    return path_nodes
+    return get_topology_index(links).path(src_node, dst_node)
 
 def find_port_and_speed(nodeA, nodeB, links, default_bps):
-    for lk in links:
-        s_node = lk["sourceNode"]
-        t_node = lk["targetNode"]
-        s_port = lk.get("sourcePort", 0)
-        t_port = lk.get("targetPort", 0)
-        link_speed_str = lk.get("linkSpeed", None)
-        bps = parse_bitrate(link_speed_str) if link_speed_str else default_bps
-        if s_node == nodeA and t_node == nodeB:
-            return (s_port, t_port, bps)
-        if s_node == nodeB and t_node == nodeA:
-            return (t_port, s_port, bps)
-    return None
+    return get_topology_index(links, default_bps).port_and_speed(nodeA, nodeB)
+
+class CompiledScenario:
+    def __init__(self, flow_names, flow_interval, flow_pkt_bytes, flow_pcp, hop_ptr,
+                 hop_node, hop_port, hop_bps, hop_default_speed, hop_tx, hop_queue, node_ids,
+                 queue_keys, queue_gates, queue_order, sim_end):
+        self.flow_names = flow_names
+        self.flow_interval = flow_interval
+        self.flow_pkt_bytes = flow_pkt_bytes
+        self.flow_pcp = flow_pcp
+        self.hop_ptr = hop_ptr
+        self.hop_node = hop_node
+        self.hop_port = hop_port
+        self.hop_bps = hop_bps
+        self.hop_default_speed = hop_default_speed
+        self.hop_tx = hop_tx
+        self.hop_queue = hop_queue
+        self.node_ids = node_ids
+        self.queue_keys = queue_keys
+        self.queue_gates = queue_gates
+        self.queue_order = queue_order
+        self.sim_end = sim_end
+
+    @property
+    def num_flows(self):
+        return len(self.flow_names)
+
+    def hyperperiod(self):
+        periods = set(self.flow_interval.tolist())
+        periods.update(g.cycle_time for g in self.queue_gates if g is not None)
+        return math.lcm(*periods) if periods else 0
+
+    def first_releases(self, start, end):
+        interval = self.flow_interval
+        first = -(-start // interval)
+        stop = np.minimum(-(-end // interval), self.sim_end // interval + 1)
+        return first, np.maximum(stop - first, 0)
+
+    def new_packets(self, start, end):
+        first, counts = self.first_releases(start, end)
+        flow = np.repeat(np.arange(self.num_flows), counts)
+        k = first[flow] + np.arange(len(flow)) - np.repeat(np.cumsum(counts) - counts, counts)
+        release = k * self.flow_interval[flow]
+        return _Packets(flow, release, self.hop_ptr[flow], release)
+
+    def packet_hops(self):
+        return (self.sim_end // self.flow_interval + 1) * np.diff(self.hop_ptr)
+
+    def subset(self, flows):
+        flows = np.asarray(flows, dtype=np.int64)
+        counts = self.hop_ptr[flows+1] - self.hop_ptr[flows]
+        hop_ptr = np.concatenate(([0], np.cumsum(counts)))
+        hops = np.repeat(self.hop_ptr[flows] - hop_ptr[:-1], counts) + np.arange(hop_ptr[-1])
+        queues, hop_queue = np.unique(self.hop_queue[hops], return_inverse=True)
+        hop_queue = hop_queue.astype(np.int32)
+        return CompiledScenario(
+            flow_names=[self.flow_names[f] for f in flows],
+            flow_interval=self.flow_interval[flows],
+            flow_pkt_bytes=self.flow_pkt_bytes[flows],
+            flow_pcp=self.flow_pcp[flows],
+            hop_ptr=hop_ptr,
+            hop_node=self.hop_node[hops],
+            hop_port=self.hop_port[hops],
+            hop_bps=self.hop_bps[hops],
+            hop_default_speed=self.hop_default_speed[hops],
+            hop_tx=self.hop_tx[hops],
+            hop_queue=hop_queue,
+            node_ids=self.node_ids,
+            queue_keys=[self.queue_keys[q] for q in queues],
+            queue_gates=[self.queue_gates[q] for q in queues],
+            queue_order=_topological_queue_order(len(queues), hop_ptr.tolist(), hop_queue.tolist()),
+            sim_end=self.sim_end,
+        )
 
-def generate_delay_plot(config):
 
-    import numpy as np
+class _Packets:
+    __slots__ = ("flow", "release", "hop", "arrival")
+
+    def __init__(self, flow, release, hop, arrival):
+        self.flow = flow
+        self.release = release
+        self.hop = hop
+        self.arrival = arrival
+
+    def __len__(self):
+        return len(self.flow)
+
+    def take(self, idx):
+        return _Packets(self.flow[idx], self.release[idx], self.hop[idx], self.arrival[idx])
+
+    @staticmethod
+    def concat(parts):
+        if len(parts) == 1:
+            return parts[0]
+        return _Packets(*(np.concatenate([getattr(p, k) for p in parts]) for k in _Packets.__slots__))
+
+    @staticmethod
+    def empty():
+        e = np.empty(0, dtype=np.int64)
+        return _Packets(e, e, e, e)
+
+
+def _topological_queue_order(num_queues, hop_ptr, hop_queue):
+    succ = [set() for _ in range(num_queues)]
+    indeg = [0] * num_queues
+    for f in range(len(hop_ptr) - 1):
+        for h in range(hop_ptr[f], hop_ptr[f+1] - 1):
+            a, b = hop_queue[h], hop_queue[h+1]
+            if b not in succ[a]:
+                succ[a].add(b)
+                indeg[b] += 1
+    order = [q for q in range(num_queues) if indeg[q] == 0]
+    for q in order:
+        for b in succ[q]:
+            indeg[b] -= 1
+            if indeg[b] == 0:
+                order.append(b)
+    return order if len(order) == num_queues else None
+
+
+def _tx_times(flow_pkt_bytes, hop_ptr, hop_bps):
+    hop_tx = np.repeat(flow_pkt_bytes, np.diff(hop_ptr)) * 8e9 / hop_bps
+    return np.ceil(hop_tx - 1e-6).astype(np.int64)
+
+
+def compile_scenario(config):
     nodes = config.get("nodes", [])
     links = config.get("links", [])
     flows_raw = config.get("flows", [])
     global_config = config.get("globalConfig", {})
     sim_time_str = global_config.get("defaultSimTime", "20ms")
-    sim_end = parse_time_to_seconds(sim_time_str)
+    sim_end = parse_time_to_ns(sim_time_str)
     if sim_end <= 0:
-        sim_end = 0.02
+        sim_end = 20_000_000
     default_link_speed_str = global_config.get("defaultLinkSpeed", "100Mbps")
-    default_link_bps = parse_bitrate(default_link_speed_str)
-    
-    gate_schedules = parse_node_gateschedules(nodes)
-    
-    from collections import defaultdict
-    next_free_time = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
-    
-    def get_gate_schedule(nodeId, portIndex, queueIndex):
-        if nodeId in gate_schedules:
-            if portIndex in gate_schedules[nodeId]:
-                if queueIndex in gate_schedules[nodeId][portIndex]:
-                    return gate_schedules[nodeId][portIndex][queueIndex]
-        return None  
-    
-    path_cache = {}
-    def get_path(src, dst):
-        if (src, dst) in path_cache:
-            return path_cache[(src, dst)]
-        p = build_hop_path(src, dst, links)
-        path_cache[(src, dst)] = p
-        return p
-    
-    results = []
-    total_packets = 0
-    delivered_packets = 0
-    
-    for fdict in flows_raw:
-        flow_name = fdict.get("name", "flow")
-        s_id = fdict.get("sourceId", "src")
-        d_id = fdict.get("destId", "dst")
-        interval_s = parse_time_to_seconds(fdict.get("interval", "200us"))
-        pkt_bytes = parse_packet_size(fdict.get("packetSize", "1000B"))
-        pcp = fdict.get("trafficClass", 0)  
-        
-        node_path = get_path(s_id, d_id)
-        if len(node_path) < 2:
-            continue
-        
-        t = 0.0
-        pkt_index = 0
-        while t <= sim_end:
-            total_packets += 1
-            pkt_index += 1
-            gen_time = t  
-            current_time = gen_time
-            delivered = True
-        
+
+    with span("delay.parse"):
+        topo = get_topology_index(links, default_link_speed_str)
+        gate_schedules = parse_node_gateschedules(nodes, parse_time_to_ns)
+
+    node_index = {}
+    queue_index = {}
+    queue_keys = []
+    queue_gates = []
+
+    flow_names, intervals, pkt_sizes, pcps = [], [], [], []
+    hop_ptr = [0]
+    hop_node, hop_port, hop_bps, hop_default_speed, hop_queue = [], [], [], [], []
+
+    with span("delay.route"):
+        for fdict in flows_raw:
+            s_id = fdict.get("sourceId", "src")
+            d_id = fdict.get("destId", "dst")
+            pcp = fdict.get("trafficClass", 0)
+
+            node_path = topo.path(s_id, d_id)
+            if len(node_path) < 2:
+                continue
+
+            hops = []
             for i in range(len(node_path) - 1):
                 srcNode = node_path[i]
                 dstNode = node_path[i+1]
-                portinfo = find_port_and_speed(srcNode, dstNode, links, default_link_bps)
+                portinfo = topo.port_and_speed(srcNode, dstNode)
                 if not portinfo:
-                    delivered = False
+                    hops = None
                     break
-                (portA, portB, link_bps) = portinfo
-                
-                base_time = max(current_time, next_free_time[srcNode][portA][pcp])
-                gsch = get_gate_schedule(srcNode, portA, pcp)
-                if gsch is not None:
-                    gate_open_time = gsch.next_open_time(base_time)
-                else:
-                    gate_open_time = base_time
-                start_tx = max(base_time, gate_open_time)
-                tx_time = (pkt_bytes * 8.0) / link_bps
-                finish_tx = start_tx + tx_time
-                if finish_tx > sim_end:
-                    delivered = False
-                    break
-                next_free_time[srcNode][portA][pcp] = finish_tx
-                current_time = finish_tx  
-            if delivered and current_time <= sim_end:
-                delivered_packets += 1
-                delay = current_time - gen_time
-                results.append((flow_name, gen_time, current_time, delay))
-            t += interval_s
-
-    stream_delays = {}
-    for (flowName, genTime, arrivalTime, delay) in results:
-        if flowName not in stream_delays:
-            stream_delays[flowName] = []
-        stream_delays[flowName].append(delay * 1000.0)  # in ms
-    
-    fig, ax = plt.subplots(figsize=(8,4))
-    bins = 30
-    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
-    for i, (flowName, delays_ms) in enumerate(sorted(stream_delays.items())):
-        ax.hist(delays_ms, bins=bins, alpha=0.6, 
-                color=colors[i % len(colors)], label=f"Stream {flowName}")
-    
-    ax.set_xlabel("End-to-End Delay (ms)")
-    ax.set_ylabel("Number of Packets")
-    total_delivered = sum(len(v) for v in stream_delays.values())
-    ax.grid(True)
-    ax.legend()
-    
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close(fig)
-    buf.seek(0)
-    return buf
+                hops.append((srcNode, portinfo[0], portinfo[2], (srcNode, dstNode) in topo.default_speed_links))
+            if hops is None:
+                continue
+
+            for (srcNode, portA, link_bps, default_speed) in hops:
+                if srcNode not in node_index:
+                    node_index[srcNode] = len(node_index)
+                qkey = (srcNode, portA, pcp)
+                if qkey not in queue_index:
+                    queue_index[qkey] = len(queue_keys)
+                    queue_keys.append(qkey)
+                    queue_gates.append(gate_schedules.get(srcNode, {}).get(portA, {}).get(pcp))
+                hop_node.append(node_index[srcNode])
+                hop_port.append(portA)
+                hop_bps.append(link_bps)
+                hop_default_speed.append(default_speed)
+                hop_queue.append(queue_index[qkey])
+            hop_ptr.append(len(hop_node))
+
+            flow_names.append(fdict.get("name", "flow"))
+            intervals.append(parse_time_to_ns(fdict.get("interval", "200us")))
+            pkt_sizes.append(parse_packet_size(fdict.get("packetSize", "1000B")))
+            pcps.append(pcp)
+
+    queue_order = _topological_queue_order(len(queue_keys), hop_ptr, hop_queue)
+    hop_ptr = np.asarray(hop_ptr, dtype=np.int64)
+    flow_pkt_bytes = np.asarray(pkt_sizes, dtype=np.int64)
+    hop_bps = np.asarray(hop_bps, dtype=np.float64)
+    hop_tx = _tx_times(flow_pkt_bytes, hop_ptr, hop_bps)
+
+    return CompiledScenario(
+        flow_names=flow_names,
+        flow_interval=np.asarray(intervals, dtype=np.int64),
+        flow_pkt_bytes=flow_pkt_bytes,
+        flow_pcp=np.asarray(pcps, dtype=np.int64),
+        hop_ptr=hop_ptr,
+        hop_node=np.asarray(hop_node, dtype=np.int32),
+        hop_port=np.asarray(hop_port, dtype=np.int32),
+        hop_bps=hop_bps,
+        hop_default_speed=np.asarray(hop_default_speed, dtype=bool),
+        hop_tx=hop_tx,
+        hop_queue=np.asarray(hop_queue, dtype=np.int32),
+        node_ids=list(node_index),
+        queue_keys=queue_keys,
+        queue_gates=queue_gates,
+        queue_order=queue_order,
+        sim_end=sim_end,
+    )
+
+
+def _fifo_starts(arrival, tx, free_at):
+    queued_before = np.cumsum(tx) - tx
+    return queued_before + np.maximum.accumulate(np.maximum(arrival - queued_before, free_at))
+
+
+def _gated_fifo_starts(arrival, tx, free_at, gsch, limit, max_sweeps=16):
+    start = gsch.next_open_times(np.maximum(arrival, free_at))
+    changed = None
+    for _ in range(max_sweeps):
+        n = np.searchsorted(start, limit, side="right")
+        if n == 0:
+            return start[:0]
+        arrival, tx, start = arrival[:n], tx[:n], start[:n]
+        # chain every backlog back to back before gating, so a backlog
+        # needs one sweep per gate closure it waits through, not per packet
+        chained = _fifo_starts(np.maximum(arrival, start), tx, free_at)
+        prev_finish = np.empty(n, dtype=start.dtype)
+        prev_finish[0] = free_at
+        prev_finish[1:] = chained[:-1] + tx[:-1]
+        swept = gsch.next_open_times(np.maximum(arrival, prev_finish))
+        changed = np.flatnonzero(swept != start)
+        start = swept
+        if not changed.size:
+            return start
+
+    # long backlogs converge one packet per sweep; serve the rest window by window
+    i = changed[0] + 1
+    free_at = int(start[i-1] + tx[i-1])
+    tx_min = int(tx.min())
+    while i < n:
+        t = int(arrival[i])
+        o, c = gsch.open_window(t if t > free_at else free_at)
+        if o > limit:
+            return start[:i]
+        j = min(i + int(arrival[i:].searchsorted(c)), i + (c - o) // tx_min + 1)
+        if j <= i + 1:
+            start[i] = o
+            free_at = o + int(tx[i])
+            i += 1
+            continue
+        seg = _fifo_starts(arrival[i:j], tx[i:j], max(free_at, o))
+        k = max(1, int(seg.searchsorted(c)))
+        start[i:i+k] = seg[:k]
+        i += k
+        free_at = int(start[i-1] + tx[i-1])
+    return start
+
+
+def _serve_queue(arrival, tx, free_at, gsch, sim_end):
+    if gsch is None:
+        start = _fifo_starts(arrival, tx, free_at)
+        start = start[:np.searchsorted(start, sim_end, side="right")]
+    else:
+        start = _gated_fifo_starts(arrival, tx, free_at, gsch, sim_end)
+    finish = start + tx[:len(start)]
+    over = np.flatnonzero(finish > sim_end)
+    if not over.size:
+        return finish, np.arange(len(finish))
+
+    # a dropped packet leaves the queue free, so later (smaller) packets may
+    # still fit before sim_end; scan the tail block by block for them
+    i = over[0]
+    if i:
+        free_at = finish[i-1]
+    kept = [np.arange(i)]
+    done = [finish[:i]]
+    k = i
+    n = np.searchsorted(arrival, sim_end, side="right")
+    while k < n:
+        stop = min(n, k + 4096)
+        base_time = np.maximum(arrival[k:stop], free_at)
+        if gsch is not None:
+            base_time = gsch.next_open_times(base_time)
+        fits = np.flatnonzero(base_time + tx[k:stop] <= sim_end)
+        if not fits.size:
+            k = stop
+            continue
+        k += fits[0]
+        free_at = base_time[fits[0]] + tx[k]
+        kept.append([k])
+        done.append([free_at])
+        k += 1
+    return (np.concatenate(done).astype(np.int64, copy=False),
+            np.concatenate(kept).astype(np.int64, copy=False))
+
+
+class _EngineState:
+    def __init__(self, num_queues):
+        self.next_free_time = np.zeros(num_queues, dtype=np.int64)
+        self.pending = _Packets.empty()
+
+    def snapshot(self, t):
+        p = self.pending
+        order = np.lexsort((p.hop, p.release, p.flow, p.arrival))
+        return (np.maximum(self.next_free_time - t, 0), p.flow[order],
+                p.release[order] - t, p.hop[order], p.arrival[order] - t)
+
+    def restore(self, snap, t):
+        nft, flow, release, hop, arrival = snap
+        self.next_free_time = nft + t
+        self.pending = _Packets(flow, release + t, hop, arrival + t)
+
+
+def _route(inbox, scn, pkts):
+    if not len(pkts):
+        return
+    queues = scn.hop_queue[pkts.hop]
+    order = np.argsort(queues, kind="stable")
+    cuts = np.flatnonzero(np.diff(queues[order])) + 1
+    for idx in np.split(order, cuts):
+        inbox[queues[idx[0]]].append(pkts.take(idx))
+
+
+def _trace_queue(trace, scn, q, pkts, start_tx, finish, free_at):
+    # packets dropped at sim_end never held the queue, so each packet waits
+    # for the previous one that was actually sent
+    prev_finish = np.empty_like(finish)
+    prev_finish[0] = free_at
+    prev_finish[1:] = finish[:-1]
+    base_time = np.maximum(pkts.arrival, prev_finish)
+    trace.write(flow=pkts.flow, hop=pkts.hop - scn.hop_ptr[pkts.flow], queue=q,
+                release=pkts.release, arrival=pkts.arrival, start=start_tx, finish=finish,
+                queue_wait=base_time - pkts.arrival, gate_wait=start_tx - base_time)
+
+
+def _simulate_window_by_queue(scn, state, start, end, packets=None, trace=None):
+    inbox = defaultdict(list)
+    _route(inbox, scn, state.pending)
+    _route(inbox, scn, scn.new_packets(start, end) if packets is None else packets)
+    pending = []
+    out_flow, out_delay = [], []
+    window_span = 0
+    dropped = 0
+    for q in scn.queue_order:
+        parts = inbox.pop(q, None)
+        if not parts:
+            continue
+        pkts = _Packets.concat(parts)
+        late = pkts.arrival >= end
+        if late.any():
+            pending.append(pkts.take(late))
+            pkts = pkts.take(~late)
+            if not len(pkts):
+                continue
+        pkts = pkts.take(np.lexsort((pkts.release, pkts.flow, pkts.arrival)))
+        tx = scn.hop_tx[pkts.hop]
+        finish, kept = _serve_queue(pkts.arrival, tx, state.next_free_time[q],
+                                    scn.queue_gates[q], scn.sim_end)
+        dropped += len(pkts) - len(kept)
+        if not len(kept):
+            continue
+        pkts = pkts.take(kept)
+        if trace is not None:
+            _trace_queue(trace, scn, q, pkts, finish - tx[kept], finish, state.next_free_time[q])
+        state.next_free_time[q] = finish[-1]
+        window_span = max(window_span, int(finish.max()) - start)
+
+        nxt = pkts.hop + 1
+        last = nxt == scn.hop_ptr[pkts.flow + 1]
+        out_flow.append(pkts.flow[last])
+        out_delay.append(finish[last] - pkts.release[last])
+        fwd = ~last
+        _route(inbox, scn, _Packets(pkts.flow[fwd], pkts.release[fwd], nxt[fwd], finish[fwd]))
+
+    state.pending = _Packets.concat(pending) if pending else _Packets.empty()
+    if not out_flow:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), window_span, dropped
+    return np.concatenate(out_flow), np.concatenate(out_delay), window_span, dropped
+
+
+def _simulate_window_by_event(scn, state, start, end, packets=None, trace=None):
+    hop_ptr = scn.hop_ptr.tolist()
+    hop_queue = scn.hop_queue.tolist()
+    hop_tx = scn.hop_tx.tolist()
+    interval = scn.flow_interval.tolist()
+    gates = scn.queue_gates
+    next_free_time = state.next_free_time.tolist()
+    sim_end = scn.sim_end
+    stop = min(end, sim_end + 1)
+
+    p = state.pending
+    events = list(zip(p.arrival.tolist(), p.flow.tolist(), p.release.tolist(), p.hop.tolist()))
+    periodic = packets is None
+    if periodic:
+        first, counts = scn.first_releases(start, end)
+        for f in np.flatnonzero(counts).tolist():
+            release = int(first[f]) * interval[f]
+            events.append((release, f, release, hop_ptr[f]))
+    else:
+        p = packets
+        events += zip(p.arrival.tolist(), p.flow.tolist(), p.release.tolist(), p.hop.tolist())
+    heapq.heapify(events)
+
+    # only the next release of each flow and the packets in flight are queued
+    out_flow, out_delay = [], []
+    records = [] if trace is not None else None
+    window_span = 0
+    dropped = 0
+    while events and events[0][0] < end:
+        t, f, release, h = heapq.heappop(events)
+        if periodic and h == hop_ptr[f]:
+            nxt = release + interval[f]
+            if nxt < stop:
+                heapq.heappush(events, (nxt, f, nxt, h))
+        q = hop_queue[h]
+        base_time = t if t > next_free_time[q] else next_free_time[q]
+        gsch = gates[q]
+        finish_tx = (gsch.next_open_time(base_time) if gsch is not None else base_time) + hop_tx[h]
+        if finish_tx > sim_end:
+            dropped += 1
+            continue
+        if records is not None:
+            records.append((f, h, q, release, t, base_time, finish_tx))
+        next_free_time[q] = finish_tx
+        if finish_tx - start > window_span:
+            window_span = finish_tx - start
+        if h + 1 < hop_ptr[f+1]:
+            heapq.heappush(events, (finish_tx, f, release, h + 1))
+        else:
+            out_flow.append(f)
+            out_delay.append(finish_tx - release)
+
+    state.next_free_time = np.asarray(next_free_time, dtype=np.int64)
+    if records:
+        f, h, q, release, arrival, base_time, finish = np.asarray(records, dtype=np.int64).T
+        start_tx = finish - scn.hop_tx[h]
+        trace.write(flow=f, hop=h - scn.hop_ptr[f], queue=q, release=release, arrival=arrival,
+                    start=start_tx, finish=finish, queue_wait=base_time - arrival,
+                    gate_wait=start_tx - base_time)
+    if events:
+        arrival, flow, release, hop = (np.asarray(c, dtype=np.int64) for c in zip(*events))
+        state.pending = _Packets(flow, release, hop, arrival)
+    else:
+        state.pending = _Packets.empty()
+    return (np.asarray(out_flow, dtype=np.int64), np.asarray(out_delay, dtype=np.int64),
+            window_span, dropped)
+
+
+def _simulate_window(scn, state, start, end, packets=None, trace=None):
+    # packets, if given, replace the periodic releases of the window;
+    # trace, if given, receives a row per transmission (see delay_trace
+    # and port_stats)
+    if scn.queue_order is not None:
+        return _simulate_window_by_queue(scn, state, start, end, packets, trace)
+    return _simulate_window_by_event(scn, state, start, end, packets, trace)
+
+
+# full runs are cut into windows of about this many releases so memory stays
+# bounded; the engine state carried between windows keeps the result exact
+WINDOW_PACKETS = 200_000
+# hyperperiods simulated one at a time before giving up on a repeating state
+HYPERPERIOD_PROBES = 8
+
+def _full_windows(scn, start=0):
+    rate = float((1.0 / scn.flow_interval).sum()) if scn.num_flows else 0.0
+    length = max(1, int(WINDOW_PACKETS / rate)) if rate > 0 else scn.sim_end + 1
+    while start <= scn.sim_end:
+        end = min(start + length, scn.sim_end + 1)
+        yield start, end
+        start = end
+
+
+def simulate_compiled(scn, mode="full", stats=None, trace=None):
+    if stats is None:
+        stats = DelayStats(scn.flow_names)
+    state = _EngineState(len(scn.queue_keys))
+
+    # a trace needs every window, so it always runs the full simulation
+    hyperperiod = scn.hyperperiod() if mode == "hyperperiod" and trace is None else 0
+    if not 0 < hyperperiod <= scn.sim_end:
+        for start, end in _full_windows(scn):
+            flow, delay, _, _ = _simulate_window(scn, state, start, end, trace=trace)
+            stats.add(flow, delay)
+        return stats
+
+    # the state at a hyperperiod boundary is each queue's backlog plus the
+    # packets still in flight; once it repeats, every following window
+    # repeats too until packets start being dropped near sim_end
+    sim_end = scn.sim_end
+    n_windows = sim_end // hyperperiod + 1
+    prev = None
+    w = 0
+    while w < n_windows:
+        start = w * hyperperiod
+        flow, delay, window_span, dropped = _simulate_window(scn, state, start, start + hyperperiod)
+        snap = state.snapshot(start + hyperperiod)
+        repeats = 1
+        if prev is not None and not dropped and all(np.array_equal(a, b) for a, b in zip(snap, prev)):
+            last_clean = min((sim_end - window_span) // hyperperiod, (sim_end + 1) // hyperperiod - 1)
+            repeats = max(1, last_clean - w + 1)
+        stats.add(flow, delay, repeats)
+        w += repeats
+        if repeats > 1:
+            state.restore(snap, w * hyperperiod)
+        elif w >= HYPERPERIOD_PROBES:
+            # no repeat yet (an overloaded queue never settles): carry on
+            # with full-run windows instead of many tiny ones
+            for start, end in _full_windows(scn, w * hyperperiod):
+                flow, delay, _, _ = _simulate_window(scn, state, start, end)
+                stats.add(flow, delay)
+            break
+        prev = snap
+    return stats
+
+
+def contention_domains(scn):
+    # flows only interact through shared (node, port, pcp) queues, so the
+    # connected components of the flow/queue graph can be simulated apart
+    parent = list(range(len(scn.queue_keys)))
+
+    def find(q):
+        while parent[q] != q:
+            parent[q] = parent[parent[q]]
+            q = parent[q]
+        return q
+
+    hop_ptr = scn.hop_ptr.tolist()
+    hop_queue = scn.hop_queue.tolist()
+    for f in range(scn.num_flows):
+        root = find(hop_queue[hop_ptr[f]])
+        for h in range(hop_ptr[f] + 1, hop_ptr[f+1]):
+            other = find(hop_queue[h])
+            if other != root:
+                parent[other] = root
+    domains = defaultdict(list)
+    for f in range(scn.num_flows):
+        domains[find(hop_queue[hop_ptr[f]])].append(f)
+    return [np.asarray(d, dtype=np.int64) for d in domains.values()]
+
+
+# below this many packet-hops the process start-up costs more than it saves
+PARALLEL_MIN_PACKET_HOPS = 500_000
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+def _pool_context():
+    # not fork: the server process runs threads (requests, plots, the PPO
+    # predictor) and may have torch loaded by the time a pool is needed
+    return get_context("forkserver" if "forkserver" in get_all_start_methods() else "spawn")
+
+def _get_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=_pool_context())
+        return _POOL
+
+
+@contextmanager
+def _worker_pool(workers):
+    # the shared pool for the default worker count, a private one otherwise
+    global _POOL
+    pool = (_get_pool() if workers == os.cpu_count()
+            else ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()))
+    try:
+        yield pool
+    except BrokenProcessPool:
+        # a crashed worker breaks the pool for good; the next call starts a new one
+        with _POOL_LOCK:
+            if _POOL is pool:
+                _POOL = None
+        raise
+    finally:
+        if pool is not _POOL:
+            pool.shutdown()
+
+
+def simulate_domains(scn, mode="full", workers=None):
+    workers = workers or os.cpu_count() or 1
+    work = scn.packet_hops()
+    if workers < 2 or work.sum() < PARALLEL_MIN_PACKET_HOPS:
+        return simulate_compiled(scn, mode)
+    domains = contention_domains(scn)
+    if len(domains) < 2:
+        return simulate_compiled(scn, mode)
+
+    # largest domains first onto the least loaded part; a few parts per
+    # worker keep the pool busy when domain sizes are uneven
+    n_parts = min(len(domains), workers * 4)
+    parts = [[] for _ in range(n_parts)]
+    load = [(0, i) for i in range(n_parts)]
+    for d in sorted(domains, key=lambda d: -int(work[d].sum())):
+        w, i = heapq.heappop(load)
+        parts[i].append(d)
+        heapq.heappush(load, (w + int(work[d].sum()), i))
+    parts = [np.sort(np.concatenate(p)) for p in parts if p]
+
+    stats = DelayStats(scn.flow_names)
+    with _worker_pool(workers) as pool:
+        futures = [pool.submit(simulate_compiled, scn.subset(flows), mode) for flows in parts]
+        for flows, fut in zip(parts, futures):
+            stats.merge(fut.result(), flows)
+    return stats
+
+
+def _queue_fingerprints(scn):
+    # a queue's departures depend only on its gate and on what arrives:
+    # each flow's interval and tx time, and for later hops the departures
+    # of the previous queue, so hash those bottom-up in topological order
+    hop_ptr = scn.hop_ptr.tolist()
+    hop_queue = scn.hop_queue.tolist()
+    hop_tx = scn.hop_tx.tolist()
+    interval = scn.flow_interval.tolist()
+    hop_flow = np.repeat(np.arange(scn.num_flows), np.diff(scn.hop_ptr)).tolist()
+    hops_by_queue = [[] for _ in scn.queue_keys]
+    rank = [0] * len(hop_queue)
+    for h, q in enumerate(hop_queue):
+        rank[h] = len(hops_by_queue[q])
+        hops_by_queue[q].append(h)
+
+    fingerprint = [None] * len(scn.queue_keys)
+    for q in scn.queue_order:
+        g = scn.queue_gates[q]
+        content = [(g.cycle_time, g.starts.tolist(), g.ends.tolist()) if g is not None else None]
+        for h in hops_by_queue[q]:
+            f = hop_flow[h]
+            if h == hop_ptr[f]:
+                content.append((interval[f], hop_tx[h]))
+            else:
+                content.append((interval[f], hop_tx[h], fingerprint[hop_queue[h-1]], rank[h-1]))
+        fingerprint[q] = hashlib.blake2b(repr(content).encode(), digest_size=16).digest()
+    return fingerprint, rank, hops_by_queue, hop_flow
+
+
+# per-flow results keyed by the fingerprint of everything upstream of the
+# flow's last hop, so an edit only re-simulates the flows downstream of it
+_FLOW_CACHE = OrderedDict()
+_FLOW_CACHE_SIZE = 20000
+_FLOW_CACHE_LOCK = threading.Lock()
+
+def simulate_cached(scn, mode="full", workers=None):
+    if scn.queue_order is None or not scn.num_flows:
+        return simulate_domains(scn, mode, workers)
+    fingerprint, rank, hops_by_queue, hop_flow = _queue_fingerprints(scn)
+    hop_ptr = scn.hop_ptr.tolist()
+    hop_queue = scn.hop_queue.tolist()
+    last = [h - 1 for h in hop_ptr[1:]]
+    keys = [(scn.sim_end, fingerprint[hop_queue[h]], rank[h]) for h in last]
+
+    stats = DelayStats(scn.flow_names)
+    missing = []
+    with _FLOW_CACHE_LOCK:
+        for f, key in enumerate(keys):
+            row = _FLOW_CACHE.get(key)
+            if row is None:
+                missing.append(f)
+            else:
+                _FLOW_CACHE.move_to_end(key)
+                stats.set_row(f, row)
+    if not missing:
+        return stats
+
+    # simulate every flow that shares a queue upstream of a missing result
+    upstream = set()
+    todo = [hop_queue[last[f]] for f in missing]
+    while todo:
+        q = todo.pop()
+        if q in upstream:
+            continue
+        upstream.add(q)
+        for h in hops_by_queue[q]:
+            if h != hop_ptr[hop_flow[h]]:
+                todo.append(hop_queue[h-1])
+    flows = sorted({hop_flow[h] for q in upstream for h in hops_by_queue[q]})
+    part = simulate_domains(scn.subset(flows), mode, workers)
+    with _FLOW_CACHE_LOCK:
+        for i, f in enumerate(flows):
+            # flows ending elsewhere may have missed traffic joining downstream
+            if hop_queue[last[f]] not in upstream:
+                continue
+            row = part.row(i)
+            stats.set_row(f, row)
+            _FLOW_CACHE[keys[f]] = row
+            _FLOW_CACHE.move_to_end(keys[f])
+        while len(_FLOW_CACHE) > _FLOW_CACHE_SIZE:
+            _FLOW_CACHE.popitem(last=False)
+    return stats
+
+
+def compute_delay_stats(config, bins=30):
+    scn = compile_scenario(config)
+    global_config = config.get("globalConfig", {})
+    mode = global_config.get("delayAnalysisMode", "full")
+    if mode == "montecarlo":
+        return _monte_carlo_report(scn, global_config, bins)
+    with span("delay.simulate"):
+        stats = simulate_cached(scn, mode)
+    with span("delay.aggregate"):
+        report = stats_report(stats.grouped(), bins)
+    report["mode"] = mode
+    return report
+
+
+def _monte_carlo_report(scn, global_config, bins):
+    replications = int(global_config.get("monteCarloReplications", MC_REPLICATIONS))
+    phase = global_config.get("phaseOffset")
+    with span("delay.montecarlo"):
+        stats, worst = simulate_monte_carlo(
+            scn, replications,
+            phase=parse_time_to_ns(phase) if phase else None,
+            jitter=parse_time_to_ns(global_config.get("releaseJitter", "0")),
+            seed=global_config.get("monteCarloSeed"))
+    with span("delay.aggregate"):
+        report = stats_report(stats.grouped(), bins)
+        # spread of the per-replication worst case of each stream
+        for row, w in zip(report["streams"], worst.grouped().summary()):
+            row["worst"] = {k: w[k] for k in ("mean", "p50", "p99", "max")}
+    report["mode"] = "montecarlo"
+    report["replications"] = replications
+    return report
+
+
+def generate_delay_plot(config):
+    return render_delay_plot(compute_delay_stats(config))
+
+
+def compute_port_series(config, bins=100):
+    scn = compile_scenario(config)
+    series = PortSeries(scn.queue_keys, scn.sim_end, bins)
+    with span("delay.ports"):
+        simulate_compiled(scn, "full", trace=series)
+    return series.report()
+
+
+def export_delay_trace(config, path, chunk_rows=TRACE_CHUNK_ROWS):
+    # writes the trace to a .npz or .parquet file; returns the row count
+    scn = compile_scenario(config)
+    with span("delay.trace"), TraceWriter(path, scn.flow_names, scn.queue_keys, chunk_rows) as trace:
+        simulate_compiled(scn, "full", trace=trace)
+    return trace.rows
+
+
+# --- parameter sweeps ---------------------------------------------------
+# Variants are flat override dicts applied to the compiled base scenario,
+# so topology, routes and queues are parsed once:
+#   "defaultLinkSpeed":                 "1Gbps"
+#   "flows.<name>.interval":            "500us"
+#   "gcl.<node>.<port>.<queue>.offset": "100us"   (or ".durations")
+
+def expand_grid(grid):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def _base_gate_entry(config, node_id, port_idx, queue_index):
+    offset, durations = "0ms", "[4ms,6ms]"
+    for node in config.get("nodes", []):
+        if node["id"] != node_id:
+            continue
+        for port_cfg in node.get("gclConfigs", []):
+            if port_cfg.get("portIndex", 0) != port_idx:
+                continue
+            for sched in port_cfg.get("schedule", []):
+                if sched.get("queueIndex", 0) == queue_index:
+                    offset = sched.get("offset", "0ms")
+                    durations = sched.get("durations", "[4ms,6ms]")
+    return offset, durations
+
+
+def _config_has_queue(config, node_id, port_idx, queue_index):
+    # the port is on a link of the node or has a gclConfig, and the queue is
+    # one of its traffic classes (8 unless the gclConfig says otherwise)
+    node = next((n for n in config.get("nodes", []) if n["id"] == node_id), None)
+    if node is None:
+        return False
+    ports = set()
+    for lk in config.get("links", []):
+        if lk["sourceNode"] == node_id:
+            ports.add(lk.get("sourcePort", 0))
+        if lk["targetNode"] == node_id:
+            ports.add(lk.get("targetPort", 0))
+    num_tc = 8
+    for port_cfg in node.get("gclConfigs", []):
+        if port_cfg.get("portIndex", 0) == port_idx:
+            ports.add(port_idx)
+            num_tc = port_cfg.get("numTrafficClasses", num_tc)
+    return port_idx in ports and 0 <= queue_index < num_tc
+
+
+def apply_overrides(scn, config, overrides):
+    variant = copy.copy(scn)
+    gcl = {}
+    for key, value in overrides.items():
+        if key == "defaultLinkSpeed":
+            variant.hop_bps = np.where(scn.hop_default_speed, parse_bitrate(value), variant.hop_bps)
+        elif key.startswith("flows."):
+            name, _, field = key[len("flows."):].rpartition(".")
+            match = np.array([n == name for n in scn.flow_names], dtype=bool)
+            if field != "interval" or not match.any():
+                raise ValueError(f"Unknown sweep parameter '{key}'")
+            variant.flow_interval = np.where(match, parse_time_to_ns(value), variant.flow_interval)
+        elif key.startswith("gcl."):
+            parts = key[len("gcl."):].rsplit(".", 3)
+            if len(parts) != 4 or parts[3] not in ("offset", "durations"):
+                raise ValueError(f"Unknown sweep parameter '{key}'")
+            node_id, port_idx, queue_index, field = parts
+            try:
+                queue = (node_id, int(port_idx), int(queue_index))
+            except ValueError:
+                raise ValueError(f"Unknown sweep parameter '{key}'")
+            if not _config_has_queue(config, *queue):
+                raise ValueError(f"Unknown sweep parameter '{key}': no such node, port or queue")
+            gcl.setdefault(queue, {})[field] = value
+        else:
+            raise ValueError(f"Unknown sweep parameter '{key}'")
+
+    variant.hop_tx = _tx_times(scn.flow_pkt_bytes, scn.hop_ptr, variant.hop_bps)
+    if gcl:
+        variant.queue_gates = list(scn.queue_gates)
+        queue_pos = {k: q for q, k in enumerate(scn.queue_keys)}
+        for (node_id, port_idx, queue_index), fields in gcl.items():
+            q = queue_pos.get((node_id, port_idx, queue_index))
+            if q is None:
+                continue  # exists, but no flow goes through this queue
+            offset, durations = _base_gate_entry(config, node_id, port_idx, queue_index)
+            offset = fields.get("offset", offset)
+            durations = fields.get("durations", durations)
+            variant.queue_gates[q] = GateSchedule(parse_time_to_ns(offset),
+                                                  parse_durations(durations, parse_time_to_ns))
+    return variant
+
+
+def _sweep_row(scn, mode, workers=None):
+    stats = simulate_cached(scn, mode, workers).grouped()
+    seen = (stats.count > 0).tolist()
+    p99 = stats.percentiles((99.0,))[:, 0]
+    return ([m / 1e6 if ok else None for m, ok in zip(stats.max.tolist(), seen)],  # in ms
+            [p / 1e6 if ok else None for p, ok in zip(p99.tolist(), seen)])
+
+
+def run_delay_sweep(config, variants=None, grid=None, workers=None):
+    variants = list(variants or []) + (expand_grid(grid) if grid else [])
+    if not variants:
+        variants = [{}]
+    scn = compile_scenario(config)
+    mode = config.get("globalConfig", {}).get("delayAnalysisMode", "full")
+    scenarios = [apply_overrides(scn, config, v) for v in variants]
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(scenarios) > 1:
+        with _worker_pool(workers) as pool:
+            futures = [pool.submit(_sweep_row, v, mode, 1) for v in scenarios]
+            rows = [fut.result() for fut in futures]
+    else:
+        rows = [_sweep_row(v, mode) for v in scenarios]
+
+    return {
+        "unit": "ms",
+        "mode": mode,
+        "streams": sorted(set(scn.flow_names)),
+        "variants": [{"overrides": v, "max": mx, "p99": p99} for v, (mx, p99) in zip(variants, rows)],
+    }
+
+
+# --- Monte Carlo release jitter -----------------------------------------
+# Each replication releases the same packets as the periodic run, shifted
+# by a random per-flow phase plus per-packet jitter. A batch of
+# replications is laid out back to back on one time axis, every one on its
+# own copy of the flows and `spacing` ns after the previous one; spacing is
+# a multiple of every gate cycle and longer than a replication takes to
+# drain, so replications see the same gates and never meet in a queue.
+# Nothing is dropped at sim_end: every released packet is delivered.
+
+MC_REPLICATIONS = 1000
+MC_BATCH_PACKETS = 1_000_000
+# tiled batches stay below this time (ns), well inside int64
+MC_MAX_TIME = 1 << 62
+
+def _tile_scenario(scn, reps, sim_end):
+    hops = len(scn.hop_queue)
+    hop_ptr = np.concatenate(([0], (scn.hop_ptr[1:] + hops * np.arange(reps)[:, None]).ravel()))
+    return CompiledScenario(
+        flow_names=scn.flow_names * reps,
+        flow_interval=np.tile(scn.flow_interval, reps),
+        flow_pkt_bytes=np.tile(scn.flow_pkt_bytes, reps),
+        flow_pcp=np.tile(scn.flow_pcp, reps),
+        hop_ptr=hop_ptr,
+        hop_node=np.tile(scn.hop_node, reps),
+        hop_port=np.tile(scn.hop_port, reps),
+        hop_bps=np.tile(scn.hop_bps, reps),
+        hop_default_speed=np.tile(scn.hop_default_speed, reps),
+        hop_tx=np.tile(scn.hop_tx, reps),
+        hop_queue=np.tile(scn.hop_queue, reps),
+        node_ids=scn.node_ids,
+        queue_keys=scn.queue_keys,
+        queue_gates=scn.queue_gates,
+        queue_order=scn.queue_order,
+        sim_end=sim_end,
+    )
+
+
+def simulate_monte_carlo(scn, replications=MC_REPLICATIONS, phase=None, jitter=0, seed=None,
+                         batch_packets=MC_BATCH_PACKETS):
+    # phase: largest per-flow release offset in ns (None: up to the flow's
+    # interval); jitter: largest per-packet release delay in ns. Returns
+    # the delay distribution over all replications and the distribution of
+    # each replication's worst delay per flow.
+    rng = np.random.default_rng(seed)
+    stats = DelayStats(scn.flow_names)
+    worst_stats = DelayStats(scn.flow_names)
+    F = scn.num_flows
+    base = scn.new_packets(0, scn.sim_end + 1)
+    P = len(base)
+    if not P or replications <= 0:
+        return stats, worst_stats
+
+    max_phase = scn.flow_interval - 1 if phase is None else np.full(F, int(phase), dtype=np.int64)
+    release_span = int((base.release + max_phase[base.flow]).max()) + int(jitter) + 1
+    cycles = [g.cycle_time for g in scn.queue_gates if g is not None]
+    cycle = math.lcm(*cycles) if cycles else 1
+    spacing = -(-2 * release_span // cycle) * cycle
+
+    batch = max(1, min(replications, batch_packets // P))
+    if batch * spacing > MC_MAX_TIME:
+        # the gate cycles share no usable common multiple: run the
+        # replications one after another, each from t = 0
+        batch, spacing = 1, 2 * release_span
+    done = 0
+    while done < replications:
+        reps = min(batch, replications - done)
+        offsets = rng.integers(0, max_phase + 1, size=(reps, F))
+        delays = rng.integers(0, int(jitter) + 1, size=(reps, P)) if jitter else 0
+        local = offsets[:, base.flow] + base.release + delays
+        rep = np.arange(reps)[:, None]
+        flow = (rep * F + base.flow).ravel()
+
+        while reps * spacing <= MC_MAX_TIME:
+            tiled = _tile_scenario(scn, reps, reps * spacing)
+            release = (rep * spacing + local).ravel()
+            pkts = _Packets(flow, release, tiled.hop_ptr[flow], release)
+            out_flow, out_delay, _, dropped = _simulate_window(
+                tiled, _EngineState(len(scn.queue_keys)), 0, reps * spacing + 1, pkts)
+            worst = np.zeros(reps * F, dtype=np.int64)
+            np.maximum.at(worst, out_flow, out_delay)
+            # a replication still busy when the next one starts would have
+            # delayed it; space them further apart and run the batch again
+            if not dropped and release_span + int(worst.max()) < spacing:
+                break
+            spacing *= 2
+        else:
+            if reps == 1:
+                raise ValueError("Monte Carlo replication does not finish within the int64 time range")
+            # too far apart to tile; redraw this batch one replication at a time
+            batch = 1
+            continue
+
+        stats.add(out_flow % F, out_delay)
+        worst_stats.add(np.tile(np.arange(F), reps), worst)
+        done += reps
+    return stats, worst_stats
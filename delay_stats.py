@@ -0,0 +1,169 @@
+import io
+import numpy as np
+from instrumentation import timed
+
+# ---------------------------------------------------------------------
+# P. Karimi @ TUE
+# ---------------------------------------------------------------------
+
+# HDR-style log buckets over integer nanoseconds: values below 2**SUB_BITS
+# get one bucket each, every following power of two is split into
+# 2**(SUB_BITS-1) equal buckets (<1% relative error). Values above
+# 2**MAX_BITS ns (~18 min) share the last bucket; min/max stay exact.
+SUB_BITS = 7
+MAX_BITS = 40
+_SUB = 1 << SUB_BITS
+_HALF = _SUB >> 1
+NUM_BUCKETS = _SUB + (MAX_BITS - SUB_BITS) * _HALF
+_MAX_VALUE = (1 << MAX_BITS) - 1
+
+PERCENTILES = (50.0, 99.0, 99.9)
+
+
+def bucket_index(values):
+    v = np.minimum(np.asarray(values, dtype=np.int64), _MAX_VALUE)
+    v = np.maximum(v, 0)
+    _, bits = np.frexp(v.astype(np.float64))
+    shift = np.maximum(bits - SUB_BITS, 0)
+    idx = np.where(shift > 0, _SUB + (shift - 1) * _HALF + (v >> shift) - _HALF, v)
+    return np.minimum(idx, NUM_BUCKETS - 1)
+
+
+def bucket_bounds(idx):
+    idx = np.asarray(idx, dtype=np.int64)
+    shift = np.where(idx >= _SUB, (idx - _SUB) // _HALF + 1, 0)
+    lower = np.where(idx >= _SUB, ((idx - _SUB) % _HALF + _HALF) << shift, idx)
+    return lower, lower + (np.int64(1) << shift)
+
+
+class DelayStats:
+    def __init__(self, names):
+        self.names = list(names)
+        n = len(self.names)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.total = np.zeros(n, dtype=np.float64)
+        self.min = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+        self.max = np.zeros(n, dtype=np.int64)
+        self.hist = np.zeros((n, NUM_BUCKETS), dtype=np.int64)
+
+    def add(self, idx, delays, weight=1):
+        if not len(idx):
+            return
+        n = len(self.names)
+        self.count += np.bincount(idx, minlength=n) * weight
+        self.total += np.bincount(idx, weights=delays, minlength=n) * weight
+        np.minimum.at(self.min, idx, delays)
+        np.maximum.at(self.max, idx, delays)
+        np.add.at(self.hist, (idx, bucket_index(delays)), weight)
+
+    def merge(self, other, rows=None):
+        if rows is None:
+            rows = np.arange(len(other.names))
+        np.add.at(self.count, rows, other.count)
+        np.add.at(self.total, rows, other.total)
+        np.minimum.at(self.min, rows, other.min)
+        np.maximum.at(self.max, rows, other.max)
+        np.add.at(self.hist, rows, other.hist)
+        return self
+
+    def row(self, i):
+        nz = np.flatnonzero(self.hist[i])
+        return (int(self.count[i]), float(self.total[i]), int(self.min[i]), int(self.max[i]),
+                nz, self.hist[i, nz])
+
+    def set_row(self, i, row):
+        self.count[i], self.total[i], self.min[i], self.max[i], nz, counts = row
+        self.hist[i] = 0
+        self.hist[i, nz] = counts
+
+    def grouped(self):
+        # flows sharing a name are reported as one stream
+        names = sorted(set(self.names))
+        pos = {name: i for i, name in enumerate(names)}
+        return DelayStats(names).merge(self, np.array([pos[n] for n in self.names], dtype=np.int64))
+
+    def mean(self):
+        return np.divide(self.total, self.count, out=np.full(len(self.names), np.nan),
+                         where=self.count > 0)
+
+    def percentiles(self, qs=PERCENTILES):
+        cum = np.cumsum(self.hist, axis=1)
+        out = np.full((len(self.names), len(qs)), np.nan)
+        seen = self.count > 0
+        for j, q in enumerate(qs):
+            rank = np.maximum(np.ceil(self.count * (q / 100.0)), 1)
+            b = (cum < rank[:, None]).sum(axis=1)
+            lower, upper = bucket_bounds(np.minimum(b, NUM_BUCKETS - 1))
+            mid = np.clip((lower + upper - 1) / 2.0, self.min, self.max)
+            out[seen, j] = mid[seen]
+        return out
+
+    def binned(self, row, bins=30):
+        # spread each log bucket over `bins` equal-width bins between min and max
+        if not self.count[row]:
+            return np.zeros(bins + 1), np.zeros(bins)
+        lo, hi = float(self.min[row]), float(self.max[row])
+        if hi <= lo:
+            lo, hi = lo - 0.5, hi + 0.5
+        nz = np.flatnonzero(self.hist[row])
+        lower, upper = bucket_bounds(nz)
+        mid = np.clip((lower + upper - 1) / 2.0, lo, hi)
+        counts, edges = np.histogram(mid, bins=bins, range=(lo, hi), weights=self.hist[row, nz])
+        return edges, counts
+
+    def summary(self, scale=1e-6):
+        pct = self.percentiles()
+        mean = self.mean()
+        rows = []
+        for i, name in enumerate(self.names):
+            seen = self.count[i] > 0
+            rows.append({
+                "name": name,
+                "count": int(self.count[i]),
+                "min": float(self.min[i]) * scale if seen else None,
+                "max": float(self.max[i]) * scale if seen else None,
+                "mean": float(mean[i]) * scale if seen else None,
+                "p50": float(pct[i, 0]) * scale if seen else None,
+                "p99": float(pct[i, 1]) * scale if seen else None,
+                "p99.9": float(pct[i, 2]) * scale if seen else None,
+            })
+        return rows
+
+
+def stats_report(stats, bins=30, scale=1e-6):
+    streams = []
+    for i, row in enumerate(stats.summary(scale)):
+        edges, counts = stats.binned(i, bins)
+        row["edges"] = (edges * scale).tolist()
+        row["counts"] = counts.tolist()
+        streams.append(row)
+    return {"unit": "ms", "streams": streams}
+
+
+@timed("delay.render")
+def render_delay_plot(report):
+    # Agg on a private Figure: no pyplot state, safe to call off the main thread
+    from matplotlib import rcParams
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(8,4))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    colors = rcParams['axes.prop_cycle'].by_key()['color']
+    for i, s in enumerate(report["streams"]):
+        if not s["count"]:
+            continue
+        # one filled step artist per stream instead of a patch per bin
+        ax.stairs(s["counts"], s["edges"], fill=True, alpha=0.6,
+                  color=colors[i % len(colors)], label=f"Stream {s['name']}")
+
+    ax.set_xlabel(f"End-to-End Delay ({report['unit']})")
+    ax.set_ylabel("Number of Packets")
+    ax.grid(True)
+    ax.legend()
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    buf.seek(0)
+    return buf
@@ -0,0 +1,133 @@
+import json
+import zipfile
+import numpy as np
+
+# ---------------------------------------------------------------------
+# P. Karimi @ TUE
+# ---------------------------------------------------------------------
+
+# Per-packet, per-hop traces of the delay engine, written column by column
+# in chunks while the simulation runs. One row per transmission:
+#   flow, hop        flow index and position on its path
+#   queue            (node, port, pcp) queue index, see the queue_* arrays
+#   release          generation time of the packet
+#   arrival          time the packet reached the queue
+#   start, finish    transmission start and end
+#   queue_wait       time spent behind other packets (base_time - arrival)
+#   gate_wait        time spent waiting for the gate (start - base_time)
+# All times are integer nanoseconds. Packets dropped at sim_end have no rows.
+#
+# .npz files hold each chunk as "<column>.<chunk>" arrays next to the
+# flow_names and queue_node/queue_port/queue_pcp tables; .parquet files
+# (needs pyarrow) hold one row group per chunk and the tables as metadata.
+
+TRACE_COLUMNS = (
+    ("flow", np.int32), ("hop", np.int32), ("queue", np.int32),
+    ("release", np.int64), ("arrival", np.int64), ("start", np.int64), ("finish", np.int64),
+    ("queue_wait", np.int64), ("gate_wait", np.int64),
+)
+TRACE_CHUNK_ROWS = 1_000_000
+
+
+class TraceWriter:
+    def __init__(self, path, flow_names, queue_keys, chunk_rows=TRACE_CHUNK_ROWS):
+        self.path = path
+        self.flow_names = list(flow_names)
+        self.queue_keys = list(queue_keys)
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.chunks = 0
+        self._parts = []
+        self._buffered = 0
+        self._parquet = str(path).endswith(".parquet")
+        if self._parquet:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ValueError("Parquet traces need pyarrow; use a .npz path instead")
+            self._schema = pa.schema([(name, pa.from_numpy_dtype(dtype)) for name, dtype in TRACE_COLUMNS],
+                                     metadata={"insim": json.dumps(self._tables())})
+            self._file = pq.ParquetWriter(path, self._schema)
+        else:
+            self._file = zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True)
+
+    def _tables(self):
+        return {"flow_names": self.flow_names,
+                "queue_node": [k[0] for k in self.queue_keys],
+                "queue_port": [int(k[1]) for k in self.queue_keys],
+                "queue_pcp": [int(k[2]) for k in self.queue_keys]}
+
+    def _write_npy(self, name, arr):
+        with self._file.open(name + ".npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asarray(arr), allow_pickle=False)
+
+    def write(self, **columns):
+        n = len(columns["flow"])
+        if not n:
+            return
+        self._parts.append({name: np.broadcast_to(np.asarray(columns[name], dtype=dtype), (n,))
+                            for name, dtype in TRACE_COLUMNS})
+        self._buffered += n
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._parts:
+            return
+        chunk = {name: np.concatenate([p[name] for p in self._parts]) for name, _ in TRACE_COLUMNS}
+        self._parts = []
+        if self._parquet:
+            import pyarrow as pa
+            self._file.write_table(pa.Table.from_arrays([chunk[name] for name, _ in TRACE_COLUMNS],
+                                                        schema=self._schema))
+        else:
+            for name, _ in TRACE_COLUMNS:
+                self._write_npy(f"{name}.{self.chunks:05d}", chunk[name])
+        self.rows += self._buffered
+        self.chunks += 1
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+        if not self._parquet:
+            tables = self._tables()
+            self._write_npy("flow_names", np.array(tables["flow_names"], dtype=str))
+            for key in ("queue_node", "queue_port", "queue_pcp"):
+                self._write_npy(key, np.array(tables[key], dtype=str if key == "queue_node" else np.int64))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_trace_chunks(path):
+    if str(path).endswith(".parquet"):
+        import pyarrow.parquet as pq
+        f = pq.ParquetFile(path)
+        for i in range(f.num_row_groups):
+            table = f.read_row_group(i)
+            yield {name: table.column(name).to_numpy() for name, _ in TRACE_COLUMNS}
+        return
+    with np.load(path) as f:
+        chunks = sorted({k.split(".")[1] for k in f.files if k.startswith("flow.")})
+        for c in chunks:
+            yield {name: f[f"{name}.{c}"] for name, _ in TRACE_COLUMNS}
+
+
+def read_trace(path):
+    # the whole trace as one array per column, plus the lookup tables
+    chunks = list(iter_trace_chunks(path))
+    trace = {name: np.concatenate([c[name] for c in chunks]) if chunks else np.empty(0, dtype=dtype)
+             for name, dtype in TRACE_COLUMNS}
+    if str(path).endswith(".parquet"):
+        import pyarrow.parquet as pq
+        tables = json.loads(pq.read_schema(path).metadata[b"insim"])
+    else:
+        with np.load(path) as f:
+            tables = {k: f[k].tolist() for k in ("flow_names", "queue_node", "queue_port", "queue_pcp")}
+    trace.update(tables)
+    return trace
@@ -1,12 +1,20 @@
 import os
+import time
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import Future
 import numpy as np
 import networkx as nx
 import pandas as pd
 import random
-import collections
 
 from stable_baselines3 import PPO
 from gym import Env, spaces
+from instrumentation import span, count
 
 # ---------------------------------------------------------------------
 # P. Karimi @ TUE
@@ -51,55 +59,203 @@ def define_zonal_topology(num_zones=6):
 
     return G
 
+@lru_cache(maxsize=None)
+def zonal_topology(num_zones=6):
+    # shared, built once per zone count; do not modify it
+    return define_zonal_topology(num_zones=num_zones)
+
+class LinkTable:
+    # per-graph link ids in G.edges() order, link rates, trunk links and
+    # shortest routes, the latter filled one source node at a time
+    def __init__(self, G):
+        self.G = G
+        self.edge_index = {edge: i for i, edge in enumerate(G.edges())}
+        self.bytes_per_ms = np.array([(G.edges[edge]["capacity_mbps"] * 1e6) / 8 / 1000.0
+                                      for edge in self.edge_index])
+        self.bytes_per_ms.setflags(write=False)
+        self.trunk_ids = trunk_edge_ids(G, self.edge_index)
+        self.trunk_ids.setflags(write=False)
+        self.key = topology_key(G)
+        self._paths = {}
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def _source(self, src):
+        with self._lock:
+            if src not in self._paths:
+                paths = nx.single_source_shortest_path(self.G, src)
+                routes = {}
+                for dst, p in paths.items():
+                    route = np.array([self.edge_index[(p[i], p[i+1])] for i in range(len(p) - 1)],
+                                     dtype=np.int64)
+                    route.setflags(write=False)
+                    routes[dst] = route
+                self._routes[src] = routes
+                self._paths[src] = paths
+            return self._paths[src], self._routes[src]
+
+    def path(self, src, dst):
+        # node list, [] if dst is unreachable; unknown nodes raise like nx.shortest_path
+        for node in (src, dst):
+            if node not in self.G:
+                raise nx.NodeNotFound(f"Node {node} not in G")
+        return self._source(src)[0].get(dst, [])
+
+    def route(self, src, dst):
+        # edge ids of path(src, dst)
+        self.path(src, dst)
+        return self._source(src)[1].get(dst)
+
+_LINK_TABLES = weakref.WeakKeyDictionary()
+_LINK_TABLES_LOCK = threading.Lock()
+
+def link_table(G):
+    # one table per graph object; a graph must not change once it has one
+    with _LINK_TABLES_LOCK:
+        table = _LINK_TABLES.get(G)
+        if table is None:
+            table = _LINK_TABLES[G] = LinkTable(G)
+        return table
+
 def load_flows(csv_file):
+    # the scenario CSV as flow dicts; TASEnv itself reads it with parse_scenario
     df = pd.read_csv(csv_file)
-    flows = []
-    for idx, row in df.iterrows():
-        flow = {
-            "id": row["id"],
-            "talker": row["talker"],
-            "listener": row["listener"],
-            "frame_size": float(row["frame_size"]),
-            "period": float(row["period"]),
-            "deadline": float(row["deadline"]),
-            "release_time": float(row["release_time"]),
-            "queue": int(row["queue"])
-        }
-        flows.append(flow)
-    return flows
+    return [{"id": i, "talker": t, "listener": l, "frame_size": float(fs), "period": float(p),
+             "deadline": float(d), "release_time": float(r), "queue": int(q)}
+            for i, t, l, fs, p, d, r, q in zip(df["id"], df["talker"], df["listener"], df["frame_size"],
+                                               df["period"], df["deadline"], df["release_time"], df["queue"])]
 
 def compute_paths(flows, G):
+    table = link_table(G)
     for flow in flows:
-        try:
-            path = nx.shortest_path(G, source=flow["talker"], target=flow["listener"])
-        except nx.NetworkXNoPath:
-            path = []
-        flow["path"] = path
+        flow["path"] = table.path(flow["talker"], flow["listener"])
     return flows
 
-def compute_metrics(flows, link_available, G):
-    total_flows = len(flows)
+def topology_key(G):
+    h = hashlib.blake2b(digest_size=8)
+    h.update(repr([(u, v, G.edges[u, v]["capacity_mbps"]) for u, v in G.edges()]).encode())
+    return h.hexdigest()
+
+SCENARIO_FIELDS = ("deadline", "frame_size", "release", "queue", "hop_ptr", "hop_edge", "hop_tx")
+
+# Set INSIM_SCENARIO_CACHE to a directory to keep parsed scenarios as .npz
+# files across processes and runs.
+SCENARIO_CACHE_DIR = os.environ.get("INSIM_SCENARIO_CACHE")
+
+# parsed scenarios by (absolute path, topology key): ((mtime_ns, size), arrays),
+# least recently used first. Every TASEnv registers its scenario files in
+# _SCENARIO_KEYS and the cache always has room for all of them, so training
+# resets never reparse; anything beyond that ages out after _SCENARIOS_SIZE
+_SCENARIOS = OrderedDict()
+_SCENARIOS_SIZE = 256
+_SCENARIO_KEYS = set()
+_SCENARIOS_LOCK = threading.Lock()
+
+
+# flow fields the scheduler reads, as named in the scenario CSV
+FLOW_FIELDS = ("talker", "listener", "frame_size", "deadline", "release_time", "queue")
+
+
+def build_scenario(flows, table):
+    # the routable flows as aligned arrays, with their hops in CSR form:
+    # flow k owns hop_edge/hop_tx[hop_ptr[k]:hop_ptr[k+1]]. flows is a list
+    # of dicts keyed like the CSV columns, or the columns themselves (a dict
+    # of arrays or a DataFrame)
+    if hasattr(flows, "keys"):
+        cols = [list(flows[k]) for k in FLOW_FIELDS]
+        if len({len(c) for c in cols}) > 1:
+            raise ValueError("Flow columns differ in length")
+        rows = list(zip(*cols))
+    else:
+        rows = [tuple(f[k] for k in FLOW_FIELDS) for f in flows]
+    rows = [r for r in rows if table.path(r[0], r[1])]
+    routes = [table.route(r[0], r[1]) for r in rows]
+    path_len = np.array([len(r) for r in routes], dtype=np.int64)
+    frame_size = np.array([float(r[2]) for r in rows], dtype=np.float64)
+    hop_edge = np.concatenate(routes) if routes else np.zeros(0, dtype=np.int64)
+    scn = {
+        "deadline": np.array([float(r[3]) for r in rows], dtype=np.float64),
+        "frame_size": frame_size,
+        "release": np.array([float(r[4]) for r in rows], dtype=np.float64),
+        "queue": np.array([int(r[5]) for r in rows], dtype=np.int64),
+        "hop_ptr": np.concatenate(([0], np.cumsum(path_len))).astype(np.int64),
+        "hop_edge": hop_edge,
+        "hop_tx": np.repeat(frame_size, path_len) / table.bytes_per_ms[hop_edge],
+    }
+    for arr in scn.values():
+        arr.setflags(write=False)
+    return scn
+
+
+def parse_scenario(csv_file, table):
+    return build_scenario(pd.read_csv(csv_file), table)
+
+
+def load_scenario(csv_file, table, cache_dir=None):
+    # parse_scenario, cached by file path and mtime; the returned arrays are
+    # shared and read-only
+    path = os.path.abspath(csv_file)
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    key = (path, table.key)
+    with _SCENARIOS_LOCK:
+        entry = _SCENARIOS.get(key)
+        if entry is not None and entry[0] == stamp:
+            _SCENARIOS.move_to_end(key)
+            return entry[1]
+
+    scn = None
+    cache_file = None
+    if cache_dir:
+        name = hashlib.blake2b(repr((key, stamp)).encode(), digest_size=16).hexdigest()
+        cache_file = os.path.join(cache_dir, name + ".npz")
+        if os.path.isfile(cache_file):
+            with np.load(cache_file) as f:
+                scn = {k: f[k] for k in SCENARIO_FIELDS}
+            for arr in scn.values():
+                arr.setflags(write=False)
+    if scn is None:
+        with span("drl.parse_scenario"):
+            scn = parse_scenario(path, table)
+        if cache_file:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, **scn)
+            os.replace(tmp, cache_file)
+    with _SCENARIOS_LOCK:
+        _SCENARIOS[key] = (stamp, scn)
+        _SCENARIOS.move_to_end(key)
+        while len(_SCENARIOS) > max(_SCENARIOS_SIZE, len(_SCENARIO_KEYS)):
+            _SCENARIOS.popitem(last=False)
+    return scn
+
+def trunk_edge_ids(G, edge_index):
+    trunk_links = []
+    for u, v in G.edges():
+        if G.nodes[u].get("type") == "switch" and \
+           (G.nodes[v].get("type") == "switch" or "Central" in v):
+            trunk_links.append(edge_index[(u, v)])
+    return np.asarray(trunk_links, dtype=np.int64)
+
+def compute_metrics(finish, arrival, deadline_time, link_busy, trunk_ids):
+    total_flows = len(finish)
     if total_flows == 0:
         return 100.0, 0.0, 100.0
 
-    successful = [f for f in flows if f["finish_time"] <= f["deadline_time"]]
-    success_rate = (len(successful) / total_flows) * 100.0
+    successful = int(np.count_nonzero(finish <= deadline_time))
+    success_rate = (successful / total_flows) * 100.0
 
     lat_sum = 0.0
-    for f in flows:
-        lat_sum += (f["finish_time"] - f["arrival_time"])
+    for lat in (finish - arrival).tolist():
+        lat_sum += lat
 
     avg_latency = lat_sum / total_flows
 
-    trunk_links = []
-    for u, v in G.edges():
-        if G.nodes[u].get("type") == "switch" and \
-           (G.nodes[v].get("type") == "switch" or "Central" in v):
-            trunk_links.append((u, v))
-
-    simulation_window = max(f["finish_time"] for f in flows)
-    total_available = simulation_window * len(trunk_links)
-    total_occupied = sum(link_available.get(edge, 0.0) for edge in trunk_links)
+    simulation_window = float(finish.max())
+    total_available = simulation_window * len(trunk_ids)
+    # busy time of the trunk links, not the time they were last in use
+    total_occupied = sum(link_busy[trunk_ids].tolist())
 
     if total_available <= 0.0:
         idle_percentage = 100.0
@@ -110,7 +266,7 @@ def compute_metrics(flows, link_available, G):
 
 class TASEnv(Env):
     def __init__(self, scenario_files, G, max_flows=50, alpha=0.01,
-                 num_queues=8, max_segments=10):
+                 num_queues=8, max_segments=10, cache_dir=None):
         super().__init__()
         self.scenario_files = scenario_files
         self.G = G
@@ -129,46 +285,83 @@ class TASEnv(Env):
         )
 
         self.current_step_count = 0
-        self.current_flows = []
         self.num_flows = 0
-        self.link_available = {}
+        self.cache_dir = cache_dir or SCENARIO_CACHE_DIR
+
+        # flow state, one aligned array per field; rows past num_flows are unused
+        n = self.max_flows
+        self.deadline = np.zeros(n)
+        self.frame_size = np.zeros(n)
+        self.release = np.zeros(n)
+        self.path_len = np.zeros(n, dtype=np.int64)
+        self.arrival = np.zeros(n)
+        self.finish = np.zeros(n)
+        self.finished = np.zeros(n, dtype=bool)
+        self.deadline_time = np.zeros(n)
+        self.queue = np.zeros(n, dtype=np.int64)
+
+        self._obs = np.zeros((self.max_flows, self.num_features), dtype=np.float32)
+        self._active = np.zeros(n)
+        self._scratch = np.zeros(n)
+
+        # links by integer id, in G.edges() order
+        self.links = link_table(G)
+        self.edge_index = self.links.edge_index
+        self.edge_bytes_per_ms = self.links.bytes_per_ms
+        self.trunk_ids = self.links.trunk_ids
+        with _SCENARIOS_LOCK:
+            _SCENARIO_KEYS.update((os.path.abspath(f), self.links.key)
+                                  for f in scenario_files if not isinstance(f, dict))
+        self.link_available = np.zeros(len(self.edge_index))
+        # busy time per link, and the union of busy time over all links:
+        # merged length so far plus the merged interval still open
+        self.link_busy = np.zeros(len(self.edge_index))
+        self.busy_closed = 0.0
+        self.busy_open = None
+        # hops of all flows: flow k owns hop_edge/hop_tx[hop_ptr[k]:hop_ptr[k+1]]
+        self.hop_ptr = np.zeros(1, dtype=np.int64)
+        self.hop_edge = np.zeros(0, dtype=np.int64)
+        self.hop_tx = np.zeros(0)
+
         self.sim_time = 0.0
         self.done = False
-        self.link_intervals = collections.defaultdict(list)
         self.meet_deadline_reward = 0.1
         self.miss_deadline_penalty = -0.1
         self.invalid_action_penalty = -0.01
 
-    def _get_observation(self):
-        DEADLINE_DIV = 10000.0
-        SIZE_DIV = 9000.0
-        RELEASE_DIV = 10000.0
-        PATHLEN_DIV = 20.0
-        EARLIEST_DIV = 200000.0
-
-        obs = np.zeros((self.max_flows, self.num_features), dtype=np.float32)
-
-        for i in range(self.num_flows):
-            f = self.current_flows[i]
-            not_finished_flag = 1.0 if (f["finish_time"] is None) else 0.0
-            d_norm = min(f["deadline"] / DEADLINE_DIV, 1.0)
-            s_norm = min(f["frame_size"] / SIZE_DIV, 1.0) if not_finished_flag > 0.5 else 0.0
-            r_norm = min(f["release_time"] / RELEASE_DIV, 1.0)
-            path_len = max(0, len(f["path"]) - 1)
-            p_norm = min(path_len / PATHLEN_DIV, 1.0)
-
-            if not_finished_flag > 0.5:
-                next_start_est = max(self.sim_time, f["arrival_time"])
-                est_norm = min(next_start_est / EARLIEST_DIV, 1.0)
-            else:
-                est_norm = 0.0
+    DEADLINE_DIV = 10000.0
+    SIZE_DIV = 9000.0
+    RELEASE_DIV = 10000.0
+    PATHLEN_DIV = 20.0
+    EARLIEST_DIV = 200000.0
+
+    def _static_observation(self):
+        # deadline, release and path length columns only change on reset
+        n = self.num_flows
+        obs = self._obs
+        obs[:] = 0.0
+        obs[:n, 1] = np.minimum(self.deadline[:n] / self.DEADLINE_DIV, 1.0)
+        obs[:n, 3] = np.minimum(self.release[:n] / self.RELEASE_DIV, 1.0)
+        obs[:n, 4] = np.minimum(self.path_len[:n] / self.PATHLEN_DIV, 1.0)
 
-            obs[i, 0] = not_finished_flag
-            obs[i, 1] = d_norm
-            obs[i, 2] = s_norm
-            obs[i, 3] = r_norm
-            obs[i, 4] = p_norm
-            obs[i, 5] = est_norm
+    def _get_observation(self):
+        n = self.num_flows
+        obs = self._obs
+        active = self._active[:n]
+        tmp = self._scratch[:n]
+        np.logical_not(self.finished[:n], out=active, casting="unsafe")
+        obs[:n, 0] = active
+
+        np.divide(self.frame_size[:n], self.SIZE_DIV, out=tmp)
+        np.minimum(tmp, 1.0, out=tmp)
+        np.multiply(tmp, active, out=tmp)
+        obs[:n, 2] = tmp
+
+        np.maximum(self.arrival[:n], self.sim_time, out=tmp)
+        np.divide(tmp, self.EARLIEST_DIV, out=tmp)
+        np.minimum(tmp, 1.0, out=tmp)
+        np.multiply(tmp, active, out=tmp)
+        obs[:n, 5] = tmp
 
         return obs.flatten()
 
@@ -176,24 +369,37 @@ class TASEnv(Env):
         self.current_step_count = 0
         self.sim_time = 0.0
         self.done = False
-        self.link_available.clear()
-        self.link_intervals.clear()
+        self.link_available[:] = 0.0
+        self.link_busy[:] = 0.0
+        self.busy_closed = 0.0
+        self.busy_open = None
 
         import random
-        scenario_path = random.choice(self.scenario_files)
-        flows = load_flows(scenario_path)
-        flows = compute_paths(flows, self.G)
-        flows = [f for f in flows if f["path"]]
-        if len(flows) > self.max_flows:
-            flows = flows[:self.max_flows]
-        self.current_flows = flows
-        self.num_flows = len(flows)
-
-        for f in self.current_flows:
-            f["arrival_time"] = f["release_time"]
-            f["deadline_time"] = f["release_time"] + f["deadline"]
-            f["finish_time"] = None
-
+        # scenario_files may also hold build_scenario results
+        scenario = random.choice(self.scenario_files)
+        if isinstance(scenario, dict):
+            scn = scenario
+        else:
+            scn = load_scenario(scenario, self.links, self.cache_dir)
+        n = self.num_flows = min(len(scn["deadline"]), self.max_flows)
+
+        self.deadline[:n] = scn["deadline"][:n]
+        self.frame_size[:n] = scn["frame_size"][:n]
+        self.release[:n] = scn["release"][:n]
+        self.queue[:n] = scn["queue"][:n]
+        self.arrival[:n] = self.release[:n]
+        self.deadline_time[:n] = self.release[:n] + self.deadline[:n]
+        self.finish[:n] = 0.0
+        self.finished[:n] = False
+
+        # hop_ptr and hop_edge stay shared with the cache, hop_tx is rewritten by step
+        hops = scn["hop_ptr"][n]
+        self.hop_ptr = scn["hop_ptr"][:n+1]
+        self.hop_edge = scn["hop_edge"][:hops]
+        self.hop_tx = scn["hop_tx"][:hops].copy()
+        self.path_len[:n] = np.diff(self.hop_ptr)
+
+        self._static_observation()
         return self._get_observation()
 
     def step(self, action):
@@ -201,7 +407,8 @@ class TASEnv(Env):
             return self._get_observation(), 0.0, True, {}
 
         gate_mask = action[:self.num_queues]
-        seg_len_norm = action[-1]
+        # all env times are float64, whatever the action's dtype
+        seg_len_norm = float(action[-1])
 
         gates_open = []
         for i in range(self.num_queues):
@@ -221,24 +428,30 @@ class TASEnv(Env):
         start_t = self.sim_time
         end_t = self.sim_time + segment_length
 
-        for f in self.current_flows:
-            if f["finish_time"] is not None:
-                continue
-            qid = f["queue"]
-            if qid not in gates_open:
-                continue
-
-            path = f["path"]
-            current_time = max(f["arrival_time"], start_t)
-            for i in range(len(path) - 1):
-                edge = (path[i], path[i+1])
-                if edge not in self.link_available:
-                    self.link_available[edge] = 0.0
-                capacity = self.G[edge[0]][edge[1]]["capacity_mbps"]
-                bytes_per_ms = (capacity * 1e6) / 8 / 1000.0
-                tx_time = f["frame_size"] / bytes_per_ms
-
-                earliest_start = max(self.link_available[edge], current_time)
+        n = self.num_flows
+        open_mask = np.zeros(self.num_queues, dtype=bool)
+        open_mask[gates_open] = True
+        # a queue outside 0..num_queues-1 has no gate and is never scheduled
+        q = self.queue[:n]
+        valid = (q >= 0) & (q < self.num_queues)
+        flows = np.flatnonzero(~self.finished[:n] & valid & open_mask[np.where(valid, q, 0)]).tolist()
+
+        # flows reserve links one after the other, so the loop stays scalar;
+        # it runs on list views of the arrays, written back below
+        link_available = self.link_available.tolist()
+        hop_ptr = self.hop_ptr.tolist()
+        hop_edge = self.hop_edge.tolist()
+        hop_tx = self.hop_tx.tolist()
+        arrival = self.arrival.tolist()
+        link_busy = self.link_busy.tolist()
+        intervals = []
+        partial = []
+        for k in flows:
+            current_time = max(arrival[k], start_t)
+            for h in range(hop_ptr[k], hop_ptr[k+1]):
+                e = hop_edge[h]
+                tx_time = hop_tx[h]
+                earliest_start = max(link_available[e], current_time)
                 finish_time = earliest_start + tx_time
 
                 if finish_time > end_t:
@@ -247,32 +460,43 @@ class TASEnv(Env):
                         pass
                     else:
                         used_up = earliest_start + portion
-                        self.link_available[edge] = used_up
-                        self.link_intervals[edge].append((earliest_start, used_up))
+                        link_available[e] = used_up
+                        link_busy[e] += portion
+                        intervals.append((earliest_start, used_up))
 
                         leftover_time = (finish_time - end_t)
-                        leftover_bytes = (leftover_time / tx_time) * f["frame_size"]
-                        f["frame_size"] = leftover_bytes
+                        leftover_bytes = (leftover_time / tx_time) * self.frame_size[k]
+                        partial.append((k, leftover_bytes))
                     break
                 else:
-                    self.link_available[edge] = finish_time
-                    self.link_intervals[edge].append((earliest_start, finish_time))
+                    link_available[e] = finish_time
+                    link_busy[e] += tx_time
+                    intervals.append((earliest_start, finish_time))
                     current_time = finish_time
             else:
-                f["finish_time"] = current_time
-
-        for f in self.current_flows:
-            if f["finish_time"] is not None:
-                if start_t <= f["finish_time"] <= end_t:
-                    if f["finish_time"] <= f["deadline_time"]:
-                        reward += self.meet_deadline_reward
-                    else:
-                        reward += self.miss_deadline_penalty
+                self.finish[k] = current_time
+                self.finished[k] = True
+
+        self.link_available[:] = link_available
+        self.link_busy[:] = link_busy
+        self._merge_busy(intervals)
+        for k, leftover_bytes in partial:
+            self.frame_size[k] = leftover_bytes
+            hops = slice(hop_ptr[k], hop_ptr[k+1])
+            self.hop_tx[hops] = leftover_bytes / self.edge_bytes_per_ms[self.hop_edge[hops]]
+
+        finish = self.finish[:n]
+        in_segment = self.finished[:n] & (start_t <= finish) & (finish <= end_t)
+        for met in (finish[in_segment] <= self.deadline_time[:n][in_segment]).tolist():
+            if met:
+                reward += self.meet_deadline_reward
+            else:
+                reward += self.miss_deadline_penalty
 
         self.sim_time = end_t
         self.current_step_count += 1
 
-        all_finished = all(f["finish_time"] is not None for f in self.current_flows)
+        all_finished = bool(self.finished[:n].all())
         if self.current_step_count >= self.max_segments or all_finished:
             self.done = True
 
@@ -287,35 +511,41 @@ class TASEnv(Env):
         return self._get_observation(), reward, self.done, info
 
     def _finalize_and_metrics(self):
-        for f in self.current_flows:
-            if f["finish_time"] is None:
-                f["finish_time"] = f["deadline_time"] + 999999
-        sr, avg_lat, idle_ = compute_metrics(self.current_flows, self.link_available, self.G)
+        n = self.num_flows
+        unfinished = ~self.finished[:n]
+        self.finish[:n][unfinished] = self.deadline_time[:n][unfinished] + 999999
+        self.finished[:n] = True
+        sr, avg_lat, idle_ = compute_metrics(self.finish[:n], self.arrival[:n], self.deadline_time[:n],
+                                             self.link_busy, self.trunk_ids)
         return sr, avg_lat, idle_
 
+    def _merge_busy(self, intervals):
+        # a step only places intervals inside its own segment, so merging
+        # each step's intervals onto the open one gives the union of the
+        # whole episode, summed in the same order
+        if not intervals:
+            return
+        intervals.sort(key=lambda x: x[0])
+        if self.busy_open is None:
+            self.busy_open = intervals[0]
+        cur_start, cur_end = self.busy_open
+        for st, ed in intervals:
+            if st <= cur_end:
+                cur_end = max(cur_end, ed)
+            else:
+                self.busy_closed += cur_end - cur_start
+                cur_start, cur_end = st, ed
+        self.busy_open = (cur_start, cur_end)
+
     def _compute_correct_idle(self):
-        if not self.current_flows:
+        if not self.num_flows:
             return 100.0
-        real_end = max(f["finish_time"] for f in self.current_flows)
+        real_end = float(self.finish[:self.num_flows].max())
         if real_end <= 0.0:
             return 100.0
-        all_intervals = []
-        for edge, intervals in self.link_intervals.items():
-            all_intervals.extend(intervals)
-        if not all_intervals:
+        if self.busy_open is None:
             return 100.0
-        all_intervals.sort(key=lambda x: x[0])
-        merged = []
-        cur_start, cur_end = all_intervals[0]
-        for i in range(1, len(all_intervals)):
-            st, ed = all_intervals[i]
-            if st <= cur_end:
-                cur_end = max(cur_end, ed)
-            else:
-                merged.append((cur_start, cur_end))
-                cur_start, cur_end = st, ed
-        merged.append((cur_start, cur_end))
-        total_busy = sum(interval[1] - interval[0] for interval in merged)
+        total_busy = self.busy_closed + (self.busy_open[1] - self.busy_open[0])
         idle_time = real_end - total_busy
         if idle_time < 0.0:
             idle_time = 0.0
@@ -354,22 +584,204 @@ def convert_actions_to_gcl(schedule_actions):
     }]
     return gcl_data
 
-def run_drl_scheduler(csv_path: str):
-    model_path = "ppo_final_model_tas.zip"
-    if not os.path.isfile(model_path):
-        raise FileNotFoundError(f"Model not found: {model_path}")
+MODEL_PATH = "ppo_final_model_tas.zip"
+
+# loaded models by absolute path: ((mtime_ns, size), blake2b digest, model)
+_MODELS = {}
+_MODELS_LOCK = threading.Lock()
+
 
-    model = PPO.load(model_path)
-    G = define_zonal_topology(num_zones=6)
-    env = TASEnv([csv_path], G, max_flows=50, alpha=0.01, num_queues=8, max_segments=10)
+def _file_digest(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.digest()
 
-    obs = env.reset()
+
+def get_model(model_path=MODEL_PATH):
+    # a model is reloaded only if its file changed: mtime and size are
+    # checked first, the content hash only when those differ
+    if not os.path.isfile(model_path):
+        raise FileNotFoundError(f"Model not found: {model_path}")
+    path = os.path.abspath(model_path)
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _MODELS_LOCK:
+        entry = _MODELS.get(path)
+        if entry is not None and entry[0] == stamp:
+            count("insim_model_cache_total", (("result", "hit"),))
+            return entry[2]
+        digest = _file_digest(path)
+        if entry is not None and entry[1] == digest:
+            _MODELS[path] = (stamp, digest, entry[2])
+            count("insim_model_cache_total", (("result", "hit"),))
+            return entry[2]
+        with span("drl.load_model"):
+            model = PPO.load(path)
+        _MODELS[path] = (stamp, digest, model)
+        count("insim_model_cache_total", (("result", "load"),))
+        return model
+
+
+def warm_up_model(model_path=MODEL_PATH):
+    # load the model and run one dummy predict, so the first scheduling
+    # request pays for neither deserialization nor torch's first call
+    model = get_model(model_path)
+    with span("drl.warm_up"):
+        obs = np.zeros(model.observation_space.shape, dtype=model.observation_space.dtype)
+        model.predict(obs, deterministic=True)
+    return model
+
+
+class BatchedPredictor:
+    # One worker thread runs the policy for every concurrent episode. It
+    # takes the first waiting observation, waits up to `window` seconds for
+    # the other active episodes to submit theirs, then runs one batched
+    # forward pass. A lone episode is served without waiting.
+    def __init__(self, model, max_batch=64, window=0.003):
+        self.model = model
+        self.max_batch = max_batch
+        self.window = window
+        self._cond = threading.Condition()
+        self._queue = []
+        self._active = 0
+        self._closed = False
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="insim-ppo-batch", daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def episode(self):
+        self._enter()
+        try:
+            yield self
+        finally:
+            self._leave()
+
+    def _enter(self):
+        with self._cond:
+            self._active += 1
+
+    def _leave(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def predict(self, obs):
+        future = Future()
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Predictor is closed")
+            self._queue.append((np.asarray(obs, dtype=np.float32), future))
+            self._cond.notify_all()
+        return future.result()
+
+    def close(self):
+        # episodes already running keep their predictor until they finish
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                if self._closed and not self._active:
+                    self._stopped = True
+                    return None
+                self._cond.wait()
+            deadline = time.monotonic() + self.window
+            while len(self._queue) < min(self.max_batch, max(self._active, 1)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._queue[:self.max_batch]
+            del self._queue[:self.max_batch]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                with span("drl.predict_batch"):
+                    actions, _ = self.model.predict(np.stack([obs for obs, _ in batch]), deterministic=True)
+            except Exception as ex:
+                for _, future in batch:
+                    future.set_exception(ex)
+                continue
+            count("insim_ppo_batches_total")
+            count("insim_ppo_batched_observations_total", value=len(batch))
+            for (_, future), action in zip(batch, actions):
+                future.set_result(action)
+
+
+_PREDICTORS = {}
+
+
+def _shared_predictor(model, model_path):
+    # the shared predictor of a model file; a reloaded model gets a new one.
+    # The caller holds _MODELS_LOCK
+    path = os.path.abspath(model_path)
+    predictor = _PREDICTORS.get(path)
+    if predictor is None or predictor.model is not model or predictor._closed:
+        if predictor is not None:
+            predictor.close()
+        predictor = _PREDICTORS[path] = BatchedPredictor(model)
+    return predictor
+
+
+def get_predictor(model_path=MODEL_PATH):
+    model = get_model(model_path)
+    with _MODELS_LOCK:
+        return _shared_predictor(model, model_path)
+
+
+@contextmanager
+def predictor_episode(model_path=MODEL_PATH):
+    # an episode on the shared predictor, registered under _MODELS_LOCK so
+    # a concurrent model reload cannot close and stop it before it starts
+    model = get_model(model_path)
+    with _MODELS_LOCK:
+        predictor = _shared_predictor(model, model_path)
+        predictor._enter()
+    try:
+        yield predictor
+    finally:
+        predictor._leave()
+
+
+def run_drl_scheduler(scenario):
+    # scenario: a CSV path, or flows in any form build_scenario takes
+    G = zonal_topology(num_zones=6)
+    # parsed directly: a request's CSV is usually a temp file, not worth caching
+    with span("drl.build_scenario"):
+        if isinstance(scenario, (str, os.PathLike)):
+            scenario = parse_scenario(scenario, link_table(G))
+        else:
+            scenario = build_scenario(scenario, link_table(G))
+    env = TASEnv([scenario], G, max_flows=50, alpha=0.01, num_queues=8, max_segments=10)
+
+    with span("drl.reset"):
+        obs = env.reset()
     done = False
     schedule_actions = []
-    while not done:
-        action, _states = model.predict(obs, deterministic=True)
-        schedule_actions.append(action)
-        obs, reward, done, info = env.step(action)
-
-    gcl_output = convert_actions_to_gcl(schedule_actions)
+    with predictor_episode(MODEL_PATH) as predictor:
+        while not done:
+            with span("drl.predict"):
+                action = predictor.predict(obs)
+            schedule_actions.append(action)
+            with span("drl.step"):
+                obs, reward, done, info = env.step(action)
+
+    with span("drl.gcl_conversion"):
+        gcl_output = convert_actions_to_gcl(schedule_actions)
     return gcl_output
+
+
+def schedule_flows(flows):
+    # in-memory entry point of the scheduler plugin contract: the app hands
+    # over flows as dicts keyed like the CSV columns, without writing a file
+    return run_drl_scheduler(flows)
@@ -0,0 +1,178 @@
+import os
+import csv
+import json
+import glob
+import time
+import random
+import argparse
+from collections import deque
+from functools import partial
+
+from stable_baselines3 import PPO
+from stable_baselines3.common.callbacks import BaseCallback, CheckpointCallback
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecMonitor
+from drl_tas_runner import TASEnv, zonal_topology
+
+# ---------------------------------------------------------------------
+# P. Karimi @ TUE
+# ---------------------------------------------------------------------
+
+# PPO training for the TAS scheduler. Scenario CSVs are generated from a
+# seed for define_zonal_topology, every vector env runs in its own process
+# on a shard of them, checkpoints are written as training goes and a JSON
+# report with env steps/s and the wall-clock time to the target reward is
+# printed at the end.
+#
+#   python drl_tas_train.py --envs 32 --timesteps 20000000 --target-reward 0.5
+#   python drl_tas_train.py --corpus scenarios/ --resume checkpoints/ppo_tas_500000_steps.zip
+
+FRAME_SIZES = (64, 128, 256, 512, 1000, 1500)
+DEADLINES = (2.0, 10.0, 100.0, 1000.0, 5000.0, 10000.0)
+RELEASES = (0.0, 0.0, 0.0, 100.0, 1000.0, 5000.0)
+
+
+def generate_scenario_corpus(out_dir, count=200, seed=0, num_zones=6, min_flows=5, max_flows=50):
+    G = zonal_topology(num_zones=num_zones)
+    endpoints = sorted(n for n in G.nodes if G.nodes[n].get("type") == "endpoint")
+    rnd = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    files = []
+    for s in range(count):
+        path = os.path.join(out_dir, f"scenario_{seed}_{s:05d}.csv")
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "talker", "listener", "frame_size", "period", "deadline", "release_time", "queue"])
+            for i in range(rnd.randint(min_flows, max_flows)):
+                talker, listener = rnd.sample(endpoints, 2)
+                writer.writerow([i, talker, listener, rnd.choice(FRAME_SIZES), 1.0,
+                                 rnd.choice(DEADLINES), rnd.choice(RELEASES), rnd.randrange(8)])
+        files.append(path)
+    return files
+
+
+def _make_env(files, num_zones, max_flows, seed, cache_dir=None):
+    # runs in the worker process; TASEnv.reset draws from the global random
+    random.seed(seed)
+    return TASEnv(files, zonal_topology(num_zones=num_zones), max_flows=max_flows,
+                  alpha=0.01, num_queues=8, max_segments=10, cache_dir=cache_dir)
+
+
+class TrainingReport(BaseCallback):
+    # env steps/s, and when the mean episode reward first reached the target
+    def __init__(self, target_reward=None, stop_at_target=False, window=100, log_every=60.0):
+        super().__init__()
+        self.target_reward = target_reward
+        self.stop_at_target = stop_at_target
+        self.rewards = deque(maxlen=window)
+        self.log_every = log_every
+        self.target_seconds = None
+        self.target_timesteps = None
+
+    def _on_training_start(self):
+        self.start = self.last_log = time.perf_counter()
+        self.start_timesteps = self.num_timesteps
+
+    def _on_step(self):
+        for info in self.locals.get("infos", ()):
+            if "episode" in info:
+                self.rewards.append(info["episode"]["r"])
+        mean = self.mean_reward()
+        if (self.target_reward is not None and self.target_seconds is None
+                and len(self.rewards) == self.rewards.maxlen and mean >= self.target_reward):
+            self.target_seconds = time.perf_counter() - self.start
+            self.target_timesteps = self.num_timesteps
+            print(f"target reward {self.target_reward} reached after {self.target_seconds:.0f}s "
+                  f"({self.num_timesteps} steps)")
+            if self.stop_at_target:
+                return False
+        now = time.perf_counter()
+        if now - self.last_log >= self.log_every:
+            self.last_log = now
+            print(f"{self.num_timesteps} steps, {self.steps_per_s():.0f} steps/s, mean reward {mean:.3f}")
+        return True
+
+    def mean_reward(self):
+        return float(sum(self.rewards)) / len(self.rewards) if self.rewards else float("nan")
+
+    def steps_per_s(self):
+        seconds = time.perf_counter() - self.start
+        return (self.num_timesteps - self.start_timesteps) / seconds if seconds > 0 else 0.0
+
+
+def train(corpus=None, scenarios=200, envs=None, timesteps=1_000_000, seed=0, num_zones=6,
+          max_flows=50, n_steps=256, checkpoint_dir="checkpoints", checkpoint_every=100_000,
+          target_reward=None, stop_at_target=False, output="ppo_tas_trained.zip", resume=None,
+          scenario_cache=None):
+    envs = envs or os.cpu_count() or 1
+    if corpus and glob.glob(os.path.join(corpus, "*.csv")):
+        files = sorted(glob.glob(os.path.join(corpus, "*.csv")))
+    else:
+        files = generate_scenario_corpus(corpus or os.path.join(checkpoint_dir, "scenarios"),
+                                         scenarios, seed, num_zones, max_flows=max_flows)
+    if len(files) < envs:
+        raise ValueError(f"{len(files)} scenarios cannot be sharded over {envs} envs")
+
+    factories = [partial(_make_env, files[rank::envs], num_zones, max_flows, seed + rank, scenario_cache)
+                 for rank in range(envs)]
+    vec_env = VecMonitor(SubprocVecEnv(factories) if envs > 1 else DummyVecEnv(factories))
+    try:
+        if resume:
+            model = PPO.load(resume, env=vec_env)
+        else:
+            model = PPO("MlpPolicy", vec_env, n_steps=n_steps, batch_size=min(256, n_steps * envs),
+                        seed=seed, verbose=0)
+        report = TrainingReport(target_reward, stop_at_target)
+        checkpoints = CheckpointCallback(save_freq=max(checkpoint_every // envs, 1),
+                                         save_path=checkpoint_dir, name_prefix="ppo_tas")
+        start = time.perf_counter()
+        model.learn(total_timesteps=timesteps, callback=[report, checkpoints],
+                    reset_num_timesteps=not resume)
+        wall = time.perf_counter() - start
+        model.save(output)
+    finally:
+        vec_env.close()
+
+    return {
+        "envs": envs,
+        "scenarios": len(files),
+        "timesteps": int(model.num_timesteps),
+        "wall_seconds": wall,
+        "env_steps_per_s": report.steps_per_s(),
+        "mean_reward": report.mean_reward(),
+        "target_reward": target_reward,
+        "target_seconds": report.target_seconds,
+        "target_timesteps": report.target_timesteps,
+        "model": output,
+        "checkpoint_dir": checkpoint_dir,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the TSN-INSIM PPO TAS scheduler")
+    parser.add_argument("--corpus", help="directory of scenario CSVs; generated into it if empty")
+    parser.add_argument("--scenarios", type=int, default=200, help="scenarios to generate")
+    parser.add_argument("--envs", type=int, help="parallel env processes (default: CPU count)")
+    parser.add_argument("--timesteps", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--zones", type=int, default=6)
+    parser.add_argument("--max-flows", type=int, default=50)
+    parser.add_argument("--n-steps", type=int, default=256, help="rollout steps per env")
+    parser.add_argument("--checkpoint-dir", default="checkpoints")
+    parser.add_argument("--checkpoint-every", type=int, default=100_000, help="env steps")
+    parser.add_argument("--target-reward", type=float, help="mean episode reward to time")
+    parser.add_argument("--stop-at-target", action="store_true")
+    parser.add_argument("--output", default="ppo_tas_trained.zip",
+                        help="final model; copy it to ppo_final_model_tas.zip to serve it")
+    parser.add_argument("--resume", help="continue from a saved model or checkpoint")
+    parser.add_argument("--scenario-cache", help="directory for parsed scenarios, shared by runs")
+    args = parser.parse_args(argv)
+
+    result = train(args.corpus, args.scenarios, args.envs, args.timesteps, args.seed, args.zones,
+                   args.max_flows, args.n_steps, args.checkpoint_dir, args.checkpoint_every,
+                   args.target_reward, args.stop_at_target, args.output, args.resume,
+                   args.scenario_cache)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+# ---------------------------------------------------------------------
+# P. Karimi @ TUE
+# ---------------------------------------------------------------------
+
+# Named timing spans and counters, exported in Prometheus text format.
+# Spans recorded inside pool worker processes stay in those processes; the
+# span around the pool call in the parent still covers their wall time.
+
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+_LOCK = threading.Lock()
+_SPANS = {}
+_COUNTERS = {}
+
+
+def record(name, seconds):
+    with _LOCK:
+        entry = _SPANS.get(name)
+        if entry is None:
+            entry = _SPANS[name] = [0, 0.0, [0] * len(BUCKETS)]
+        entry[0] += 1
+        entry[1] += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                entry[2][i] += 1
+                break
+
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def timed(name):
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, labels=(), value=1):
+    key = (name, tuple(sorted(dict(labels).items())))
+    with _LOCK:
+        _COUNTERS[key] = _COUNTERS.get(key, 0) + value
+
+
+def snapshot():
+    with _LOCK:
+        spans = {k: (v[0], v[1], list(v[2])) for k, v in _SPANS.items()}
+        counters = dict(_COUNTERS)
+    return spans, counters
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+
+def render_prometheus():
+    spans, counters = snapshot()
+    lines = ["# HELP insim_span_seconds Time spent in named code spans.",
+             "# TYPE insim_span_seconds histogram"]
+    for name in sorted(spans):
+        calls, total, buckets = spans[name]
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            lines.append(f'insim_span_seconds_bucket{_labels([("span", name), ("le", bound)])} {cumulative}')
+        lines.append(f'insim_span_seconds_bucket{_labels([("span", name), ("le", "+Inf")])} {calls}')
+        lines.append(f'insim_span_seconds_sum{_labels([("span", name)])} {total!r}')
+        lines.append(f'insim_span_seconds_count{_labels([("span", name)])} {calls}')
+
+    names = sorted({name for name, _ in counters})
+    for name in names:
+        lines.append(f"# TYPE {name} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# Opt-in per-request profiles: set INSIM_PROFILE_DIR and add ?profile=1 to
+# a request; the cProfile dump lands in that directory.
+PROFILE_DIR = os.environ.get("INSIM_PROFILE_DIR")
+
+
+def install_flask_hooks(app):
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_span():
+        g.insim_start = time.perf_counter()
+        g.insim_profile = None
+        if PROFILE_DIR and request.args.get("profile") == "1":
+            import cProfile
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                return  # another profiler is already active in this process
+            g.insim_profile = profile
+
+    @app.after_request
+    def _finish_request_span(response):
+        endpoint = request.endpoint or "unknown"
+        start = g.pop("insim_start", None)
+        if start is not None:
+            record(f"http.{endpoint}", time.perf_counter() - start)
+        count("insim_http_requests_total", (("endpoint", endpoint), ("status", response.status_code)))
+
+        profile = g.pop("insim_profile", None)
+        if profile is not None:
+            profile.disable()
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            try:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                profile.dump_stats(os.path.join(PROFILE_DIR, f"{endpoint}-{stamp}-{threading.get_ident()}.prof"))
+            except OSError as ex:
+                print(f"Could not write request profile: {ex}")
+        return response
@@ -0,0 +1,88 @@
+import numpy as np
+
+# ---------------------------------------------------------------------
+# P. Karimi @ TUE
+# ---------------------------------------------------------------------
+
+# Binned time series per (node, port, pcp) queue, in fixed-size
+# (queues x bins) arrays. PortSeries takes the same rows as
+# delay_trace.TraceWriter, so the engine feeds it as a trace sink:
+#   busy       time the queue was transmitting           [start, finish)
+#   gate_wait  packet time spent waiting for the gate     [start - gate_wait, start)
+#   backlog    packet time spent queued before sending    [arrival, start)
+# Divided by the bin width these are utilization and the mean number of
+# gate-blocked and queued packets. The engine serves the pcp queues of a
+# port independently, so a port utilization above 1 marks a port that is
+# oversubscribed.
+
+SERIES = ("busy", "gate_wait", "backlog")
+
+
+class PortSeries:
+    def __init__(self, queue_keys, sim_end, bins=100):
+        self.queue_keys = list(queue_keys)
+        self.bins = bins
+        self.width = -(-(sim_end + 1) // bins)
+        shape = (len(self.queue_keys), bins + 1)
+        # per series: partial-bin time, plus a difference array of whole bins
+        self._part = {k: np.zeros(shape, dtype=np.int64) for k in SERIES}
+        self._full = {k: np.zeros(shape, dtype=np.int64) for k in SERIES}
+
+    def _add(self, name, q, a, b):
+        W, n = self.width, self.bins
+        a = np.clip(a, 0, n * W)
+        b = np.clip(b, a, n * W)
+        i0, i1 = a // W, b // W
+        same = i0 == i1
+        np.add.at(self._part[name], (q[same], i0[same]), (b - a)[same])
+        q, a, b, i0, i1 = q[~same], a[~same], b[~same], i0[~same], i1[~same]
+        np.add.at(self._part[name], (q, i0), (i0 + 1) * W - a)
+        np.add.at(self._part[name], (q, i1), b - i1 * W)
+        np.add.at(self._full[name], (q, i0 + 1), W)
+        np.add.at(self._full[name], (q, i1), -W)
+
+    def write(self, **columns):
+        if not len(columns["flow"]):
+            return
+        q = np.broadcast_to(np.asarray(columns["queue"], dtype=np.int64), (len(columns["flow"]),))
+        start = columns["start"]
+        self._add("busy", q, start, columns["finish"])
+        self._add("gate_wait", q, start - columns["gate_wait"], start)
+        self._add("backlog", q, columns["arrival"], start)
+
+    def series(self, name):
+        # ns per bin
+        full = np.cumsum(self._full[name], axis=1)
+        return (self._part[name] + full)[:, :self.bins]
+
+    def ports(self):
+        # (node, port) egress ports and the queue rows that share each one
+        index = {}
+        for q, (node, port, _) in enumerate(self.queue_keys):
+            index.setdefault((node, port), []).append(q)
+        return index
+
+    def report(self, scale=1e-6):
+        W = float(self.width)
+        util = self.series("busy") / W
+        gate = self.series("gate_wait") / W
+        backlog = self.series("backlog") / W
+        ports = self.ports()
+        port_util = np.array([util[qs].sum(axis=0) for qs in ports.values()]).reshape(len(ports), self.bins)
+        return {
+            "unit": "ms",
+            "bin_width": W * scale,
+            "edges": (np.arange(self.bins + 1) * W * scale).tolist(),
+            "queues": [{"node": node, "port": int(port), "pcp": int(pcp),
+                        "peak_utilization": float(u.max(initial=0.0)),
+                        "mean_utilization": float(u.mean()) if self.bins else 0.0}
+                       for (node, port, pcp), u in zip(self.queue_keys, util)],
+            "utilization": util.tolist(),
+            "gate_wait": gate.tolist(),
+            "backlog": backlog.tolist(),
+            "ports": [{"node": node, "port": int(port),
+                       "peak_utilization": float(u.max(initial=0.0)),
+                       "mean_utilization": float(u.mean()) if self.bins else 0.0}
+                      for (node, port), u in zip(ports, port_util)],
+            "port_utilization": port_util.tolist(),
+        }
@@ -426,6 +426,9 @@ function refreshLinksList() {
 function openGlobalConfigModal() {
   document.getElementById("globalSimTime").value = globalConfig.defaultSimTime;
   document.getElementById("globalLinkSpeed").value = globalConfig.defaultLinkSpeed;
+  document.getElementById("globalDelayMode").value = globalConfig.delayAnalysisMode || "full";
+  document.getElementById("globalMcReplications").value = globalConfig.monteCarloReplications || 1000;
+  document.getElementById("globalReleaseJitter").value = globalConfig.releaseJitter || "0us";
   showModal("globalConfigModal");
 }
 
@@ -436,6 +439,9 @@ function closeGlobalConfigModal() {
 function saveGlobalConfig() {
   globalConfig.defaultSimTime = document.getElementById("globalSimTime").value;
   globalConfig.defaultLinkSpeed = document.getElementById("globalLinkSpeed").value;
+  globalConfig.delayAnalysisMode = document.getElementById("globalDelayMode").value;
+  globalConfig.monteCarloReplications = parseInt(document.getElementById("globalMcReplications").value, 10) || 1000;
+  globalConfig.releaseJitter = document.getElementById("globalReleaseJitter").value;
   closeGlobalConfigModal();
 }
 
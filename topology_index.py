@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict, defaultdict, deque
+
+# ---------------------------------------------------------------------
+# P. Karimi @ TUE
+# ---------------------------------------------------------------------
+
+def parse_bitrate(speed_str):
+    s = speed_str.strip().lower()
+    if s.endswith("mbps"):
+        val = float(s.replace("mbps", ""))
+        return val * 1e6
+    elif s.endswith("gbps"):
+        val = float(s.replace("gbps", ""))
+        return val * 1e9
+    else:
+        return 100e6
+
+
+class TopologyIndex:
+    def __init__(self, links, default_bps=100e6):
+        self.default_bps = default_bps
+        self.adjacency = defaultdict(list)
+        self.link_table = {}
+        self.port_counts = defaultdict(int)
+        self.default_speed_links = set()
+        self._parents = {}
+        for lk in links:
+            nA = lk["sourceNode"]
+            nB = lk["targetNode"]
+            pA = lk.get("sourcePort", 0)
+            pB = lk.get("targetPort", 0)
+            link_speed_str = lk.get("linkSpeed", None)
+            bps = parse_bitrate(link_speed_str) if link_speed_str else default_bps
+            self.adjacency[nA].append(nB)
+            self.adjacency[nB].append(nA)
+            for key, value in (((nA, nB), (pA, pB, bps)), ((nB, nA), (pB, pA, bps))):
+                if key not in self.link_table:
+                    self.link_table[key] = value
+                    if not link_speed_str:
+                        self.default_speed_links.add(key)
+            self.port_counts[nA] = max(self.port_counts[nA], pA + 1)
+            self.port_counts[nB] = max(self.port_counts[nB], pB + 1)
+
+    def bfs_tree(self, src_node):
+        parent = self._parents.get(src_node)
+        if parent is None:
+            parent = {src_node: None}
+            queue = deque([src_node])
+            while queue:
+                cur = queue.popleft()
+                for nbr in self.adjacency.get(cur, ()):
+                    if nbr not in parent:
+                        parent[nbr] = cur
+                        queue.append(nbr)
+            self._parents[src_node] = parent
+        return parent
+
+    def path(self, src_node, dst_node):
+        parent = self.bfs_tree(src_node)
+        if dst_node not in parent:
+            return []
+        path_nodes = []
+        x = dst_node
+        while x is not None:
+            path_nodes.append(x)
+            x = parent[x]
+        path_nodes.reverse()
+        return path_nodes
+
+    def port_and_speed(self, nodeA, nodeB):
+        return self.link_table.get((nodeA, nodeB))
+
+
+_INDEX_CACHE = OrderedDict()
+_INDEX_CACHE_SIZE = 8
+_INDEX_CACHE_LOCK = threading.Lock()
+
+def _links_key(links, default_bps):
+    return (default_bps,) + tuple(
+        (lk["sourceNode"], lk.get("sourcePort", 0), lk["targetNode"],
+         lk.get("targetPort", 0), lk.get("linkSpeed", None))
+        for lk in links
+    )
+
+def get_topology_index(links, default_link_speed="100Mbps"):
+    default_bps = parse_bitrate(default_link_speed) if isinstance(default_link_speed, str) else default_link_speed
+    key = _links_key(links, default_bps)
+    with _INDEX_CACHE_LOCK:
+        topo = _INDEX_CACHE.get(key)
+        if topo is not None:
+            _INDEX_CACHE.move_to_end(key)
+            return topo
+    # built outside the lock; a thread that loses the race uses the winner's
+    topo = TopologyIndex(links, default_bps)
+    with _INDEX_CACHE_LOCK:
+        topo = _INDEX_CACHE.setdefault(key, topo)
+        _INDEX_CACHE.move_to_end(key)
+        while len(_INDEX_CACHE) > _INDEX_CACHE_SIZE:
+            _INDEX_CACHE.popitem(last=False)
+    return topo